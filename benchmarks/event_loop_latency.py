@@ -0,0 +1,96 @@
+"""Measure GET / latency while the leaderboard's CSV is being rewritten.
+
+Storage calls run in a thread pool, so the event loop, and with it GET /, should not stall
+while a large records.csv is compacted/rewritten in the background.
+
+Requires httpx on top of the requirements. Usage (from the repository's root):
+    python benchmarks/event_loop_latency.py --n-records 500000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+def write_records(filepath: Path, n_records: int) -> None:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'name': [f"Rider {i}" for i in range(n_records)],
+        'datetime': pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 5 * 365 * 86400, n_records), unit='s'),
+        'duration_s': rng.integers(30000, 90000, n_records),
+        'avatar_url': "https://avatars.githubusercontent.com/u/38256417",
+    }).sort_values(by=['duration_s', 'datetime'])
+    df.insert(0, 'id', range(1, n_records + 1))
+    df.insert(0, 'rank', range(1, n_records + 1))
+    df.to_csv(filepath, index=False)
+
+
+def summarize(name: str, latencies_s: list[float]) -> None:
+    latencies_ms = sorted(1000 * latency for latency in latencies_s)
+    p99 = latencies_ms[int(0.99 * (len(latencies_ms) - 1))]
+    print(f"{name:>22}: p50={statistics.median(latencies_ms):7.2f}ms  p99={p99:7.2f}ms  max={latencies_ms[-1]:7.2f}ms")
+
+
+async def measure_root(client, duration_s: float) -> list[float]:
+    latencies = []
+    end = time.perf_counter() + duration_s
+    while time.perf_counter() < end:
+        start = time.perf_counter()
+        response = await client.get("/")
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.005)
+    return latencies
+
+
+async def rewrite_continuously(main, client, stop: asyncio.Event) -> int:
+    n_rewrites = 0
+    while not stop.is_set():
+        response = await client.post("/add-record", json={"name": "Benchmark", "datetime": "2024-01-01", "duration_s": 60000})
+        response.raise_for_status()
+        await main.run_blocking(main.leaderboard.compact)  # Rewrites the whole records.csv
+        n_rewrites += 1
+    return n_rewrites
+
+
+async def run(n_records: int, duration_s: float) -> None:
+    import httpx
+    import main
+
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            await client.get("/podium")  # Load the records
+
+            summarize("idle", await measure_root(client, duration_s))
+
+            stop = asyncio.Event()
+            rewriter = asyncio.create_task(rewrite_continuously(main, client, stop))
+            latencies = await measure_root(client, duration_s)
+            stop.set()
+            n_rewrites = await rewriter
+            summarize(f"during {n_rewrites} rewrites", latencies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-records", type=int, default=500_000)
+    parser.add_argument("--duration-s", type=float, default=10)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    os.chdir(tempfile.mkdtemp())  # main.py stores its data in ./data
+    Path('data').mkdir()
+    print(f"Writing {args.n_records} records...")
+    write_records(Path('data/records.csv'), args.n_records)
+
+    import logging
+    logging.disable(logging.INFO)
+    asyncio.run(run(args.n_records, args.duration_s))
@@ -0,0 +1,93 @@
+"""Compare the msgspec-based serialization (see serialization.py) with the previous, FastAPI/pydantic-based one.
+
+Encoding: the content of GET /records, i.e. {"records": [...]}, serialized
+- by FastAPI's default path, `jsonable_encoder` then JSONResponse's `json.dumps`, as for endpoints returning a dict,
+- by `json.dumps` alone, as the response cache did,
+- by `dump_json`, over the rows as dicts, as served now,
+- by msgspec over struct rows, built from the dicts.
+Decoding: that many POST /add-record bodies, validated by the former pydantic model or by `decode_record`.
+
+Usage (from the repository's root):
+    python benchmarks/serialization.py --n-rows 1000 100000 1000000
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import msgspec
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from serialization import decode_record, dump_json  # noqa: E402
+from synthetic import generate_records  # noqa: E402
+
+
+class PydanticRecord(BaseModel):
+    name: str
+    datetime: str
+    duration_s: int
+
+
+class RecordRow(msgspec.Struct):
+    rank: int
+    id: int
+    name: str
+    datetime: datetime
+    duration_s: int
+    avatar_url: str | None
+
+
+def _json_default(o):
+    if isinstance(o, datetime):
+        return o.isoformat()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def measure(fn, n_repeats: int) -> float:
+    best = float('inf')
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-rows", type=int, nargs="+", default=[1000, 100_000, 1_000_000])
+    parser.add_argument("--n-repeats", type=int, default=3, help="Best of that many runs is reported.")
+    args = parser.parse_args()
+
+    for n_rows in args.n_rows:
+        records = [{'rank': i + 1, 'id': i + 1, **record} for i, record in enumerate(generate_records(n_rows, seed=0))]
+        content = {"records": records}
+        bodies = [
+            dump_json({'name': record['name'], 'datetime': record['datetime'].isoformat(), 'duration_s': record['duration_s']})
+            for record in records
+        ]
+
+        reference = JSONResponse(jsonable_encoder(content)).body
+        assert dump_json(content) == reference, "dump_json must produce the same JSON as FastAPI"
+
+        timings = {
+            "encode: jsonable_encoder + JSONResponse": lambda: JSONResponse(jsonable_encoder(content)).body,
+            "encode: json.dumps": lambda: json.dumps(
+                content, default=_json_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+            ).encode("utf-8"),
+            "encode: dump_json (msgspec, dict rows)": lambda: dump_json(content),
+            "encode: msgspec, struct rows (incl. build)": lambda: dump_json({"records": [RecordRow(**r) for r in records]}),
+            "decode: pydantic model": lambda: [PydanticRecord.model_validate_json(body) for body in bodies],
+            "decode: decode_record (msgspec)": lambda: [decode_record(body) for body in bodies],
+        }
+        print(f"{n_rows} rows ({len(reference) / 1e6:.1f} MB):")
+        for name, fn in timings.items():
+            print(f"  {name:<44}: {1000 * measure(fn, args.n_repeats):10.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
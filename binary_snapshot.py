@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+MAGIC = b'SCVREC01'
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('n_rows', '<u8'), ('heap_offset', '<u8')])
+ROW_DTYPE = np.dtype([
+    ('rank', '<i8'),
+    ('id', '<i8'),
+    ('duration_s', '<i8'),
+    ('datetime_us', '<i8'),  # Microseconds since the epoch (naive UTC)
+    ('name_offset', '<u8'),  # Offsets into the string heap
+    ('avatar_url_offset', '<u8'),
+    ('name_length', '<i4'),
+    ('avatar_url_length', '<i4'),  # -1 if there is no avatar_url
+])
+EPOCH = datetime(1970, 1, 1)
+
+
+def _encode_strings(values: list[str | None], offset: int) -> tuple[np.ndarray, np.ndarray, list[bytes]]:
+    encoded = [b'' if value is None else value.encode('utf-8') for value in values]
+    lengths = np.fromiter((len(e) for e in encoded), dtype='<i8', count=len(encoded))
+    offsets = offset + np.cumsum(lengths) - lengths
+    lengths[[value is None for value in values]] = -1
+    return offsets, lengths, encoded
+
+
+def write_binary_snapshot(rows: list[dict], filepath: Path) -> None:
+    """Write the records as fixed-width rows followed by a heap holding their strings.
+
+    Args:
+        rows (list[dict]): All the records, in rank order.
+        filepath (Path): Path to the file.
+    """
+    table = np.zeros(len(rows), dtype=ROW_DTYPE)
+    table['rank'] = np.arange(1, len(rows) + 1)
+    table['id'] = [row['id'] for row in rows]
+    table['duration_s'] = [row['duration_s'] for row in rows]
+    table['datetime_us'] = [(row['datetime'] - EPOCH) // timedelta(microseconds=1) for row in rows]
+
+    name_offsets, name_lengths, names = _encode_strings([row['name'] for row in rows], offset=0)
+    heap_size = int(np.maximum(name_lengths, 0).sum())
+    avatar_offsets, avatar_lengths, avatars = _encode_strings([row['avatar_url'] for row in rows], offset=heap_size)
+    table['name_offset'], table['name_length'] = name_offsets, name_lengths
+    table['avatar_url_offset'], table['avatar_url_length'] = avatar_offsets, avatar_lengths
+
+    header = np.array([(MAGIC, len(rows), HEADER_DTYPE.itemsize + table.nbytes)], dtype=HEADER_DTYPE)
+    with open(filepath, 'wb') as f:
+        f.write(header.tobytes())
+        f.write(table.tobytes())
+        f.write(b''.join(names))
+        f.write(b''.join(avatars))
+
+
+class BinarySnapshot:
+    """Memory-mapped view of a binary snapshot of the records, see `write_binary_snapshot`.
+
+    The rows are viewed in place as a NumPy structured array, in rank order,
+    so a range of ranks is sliced without parsing the file, and only the returned records are decoded.
+    The leaderboard does not serve pages from the mapped file though: `LogStorage` decodes all the records
+    when loading, as for the other snapshot formats, the gain being a load without text parsing.
+    """
+
+    def __init__(self, filepath: Path):
+        self._buffer = np.memmap(filepath, dtype=np.uint8, mode='r')
+        header = self._buffer[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)[0]
+        if header['magic'] != MAGIC:
+            raise ValueError(f"{filepath} is not a binary snapshot of the records")
+
+        heap_offset = int(header['heap_offset'])
+        self.rows = self._buffer[HEADER_DTYPE.itemsize:heap_offset].view(ROW_DTYPE)
+        self._heap = self._buffer[heap_offset:]
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _strings(self, offsets: np.ndarray, lengths: np.ndarray) -> list[str | None]:
+        # The strings of consecutive rows are consecutive in the heap: copy their span once, and slice it
+        if len(offsets) == 0:
+            return []
+        start = int(offsets[0])
+        span = self._heap[start:int(offsets[-1]) + max(int(lengths[-1]), 0)].tobytes()
+        return [
+            None if length < 0 else span[offset - start:offset - start + length].decode('utf-8')
+            for offset, length in zip(offsets.tolist(), lengths.tolist())
+        ]
+
+    def records(self, start: int = 0, stop: int | None = None) -> list[dict]:
+        """Decode the records in the given range of positions, i.e. ranks from start + 1 to stop.
+
+        The numeric columns are converted a column at a time, rather than field by field.
+
+        Args:
+            start (int, optional): Index (0-based) of the first record to return. Defaults to 0.
+            stop (int | None, optional): Index (0-based, exclusive) of the last record to return. Defaults to None.
+
+        Returns:
+            list[dict]: The records, with their rank.
+        """
+        rows = self.rows[start:stop]
+        return [
+            {'rank': rank, 'id': id, 'name': name, 'datetime': dt, 'duration_s': duration_s, 'avatar_url': avatar_url}
+            for rank, id, name, dt, duration_s, avatar_url in zip(
+                rows['rank'].tolist(),
+                rows['id'].tolist(),
+                self._strings(rows['name_offset'], rows['name_length']),
+                rows['datetime_us'].astype('datetime64[us]').tolist(),  # As naive datetimes
+                rows['duration_s'].tolist(),
+                self._strings(rows['avatar_url_offset'], rows['avatar_url_length']),
+            )
+        ]
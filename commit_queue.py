@@ -0,0 +1,105 @@
+import asyncio
+import inspect
+import logging
+from concurrent.futures import Executor
+from typing import Awaitable, Callable
+
+from leaderboard import Leaderboard
+
+logger = logging.getLogger(__name__)
+
+
+class CommitQueue:
+    """Single writer through which all additions to the leaderboard go.
+
+    Submissions are queued, and a single asyncio task drains them in batches:
+    each batch is inserted in one go and persisted once (group commit),
+    and each submitter is then handed the ranks its records got.
+    Concurrent submissions can therefore neither overwrite each other nor each pay for a write.
+    The commits themselves run in the given executor, to keep the event loop free during disk I/O.
+    After each commit, the listeners are called on the event loop with the committed records, see `add_listener`.
+    """
+
+    def __init__(self, leaderboard: Leaderboard, executor: Executor, max_batch_size: int):
+        self.leaderboard = leaderboard
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self._queue = asyncio.Queue()
+        self._task = None
+        self._listeners = []
+
+    def add_listener(self, listener: Callable[[int, list[dict]], Awaitable[None] | None]) -> None:
+        """Call the listener after each commit, with the leaderboard's version once committed
+        and the committed records, with their id and rank.
+
+        Listeners run on the event loop, between commits, so they must not block.
+        A coroutine listener is awaited before the next commit, so it sees the leaderboard as committed.
+
+        Args:
+            listener (Callable[[int, list[dict]], Awaitable[None] | None]): The listener.
+        """
+        self._listeners.append(listener)
+
+    def start(self) -> None:
+        """Start the writer task, on the running event loop."""
+        self._task = asyncio.create_task(self._run(), name="commit-queue")
+
+    async def stop(self) -> None:
+        """Commit the pending submissions, and stop the writer task."""
+        await self._queue.put(None)
+        await self._task
+
+    async def submit(self, records: list[dict]) -> list[int]:
+        """Add the records to the leaderboard, once the writer commits them.
+
+        Args:
+            records (list[dict]): Records to add, with keys 'name', 'datetime', 'duration_s' and 'avatar_url'.
+
+        Raises:
+            Exception: Whatever prevented the batch from being committed.
+
+        Returns:
+            list[int]: The rank of each record once committed.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((records, future))
+        return await future
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            # Wait for a submission, then take everything already pending along with it
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            if None in batch:  # Stop sentinel, submitted after the other pending submissions
+                stopping = True
+                batch = [submission for submission in batch if submission is not None]
+            if batch:
+                await self._commit(batch)
+
+    async def _commit(self, batch: list[tuple[list[dict], asyncio.Future]]) -> None:
+        records = [record for submitted, _ in batch for record in submitted]
+        try:
+            version, added = await asyncio.get_running_loop().run_in_executor(self.executor, self.leaderboard.add, records)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():  # The submitter may have been cancelled meanwhile
+                    future.set_exception(e)
+            return
+
+        logger.info(f"Committed {len(batch)} submissions ({len(records)} records)")
+        ranks = [record['rank'] for record in added]
+        start = 0
+        for submitted, future in batch:
+            if not future.done():
+                future.set_result(ranks[start:start + len(submitted)])
+            start += len(submitted)
+
+        for listener in self._listeners:
+            try:
+                result = listener(version, added)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:  # A failing listener must neither fail the commit nor stop the writer
+                logger.error(f"Error in commit listener {listener}: {e}")
@@ -0,0 +1,65 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def format_sse(data: bytes, event: str | None = None, id: str | None = None) -> bytes:
+    """Format a Server-Sent Event, see https://html.spec.whatwg.org/multipage/server-sent-events.html.
+
+    Args:
+        data (bytes): The event's data, on a single line (e.g. compact JSON).
+        event (str | None, optional): The event's type. Defaults to None, i.e. 'message'.
+        id (str | None, optional): The event's id, sent back by reconnecting clients as Last-Event-ID. Defaults to None.
+
+    Returns:
+        bytes: The event, ready to be written to the stream.
+    """
+    lines = []
+    if id is not None:
+        lines.append(f"id: {id}\n".encode())
+    if event is not None:
+        lines.append(f"event: {event}\n".encode())
+    lines.append(b"data: " + data + b"\n\n")
+    return b"".join(lines)
+
+
+class Broadcaster:
+    """Fan-out of messages to subscribers, each having its own bounded queue.
+
+    Publishing never waits on a subscriber: one whose queue is full, i.e. which is too slow to keep up,
+    is dropped, its queue then ending with None so that its consumer can close its connection
+    (and the client reconnect and refetch what it missed).
+    Meant to be used from the event loop only.
+    """
+
+    def __init__(self, max_queue_size: int):
+        self.max_queue_size = max_queue_size
+        self._queues = set()
+
+    def __len__(self) -> int:
+        return len(self._queues)
+
+    def subscribe(self) -> asyncio.Queue:
+        """Subscribe to the messages published from now on.
+
+        Returns:
+            asyncio.Queue: The queue of the messages, ending with None if the subscriber was dropped.
+        """
+        queue = asyncio.Queue(maxsize=self.max_queue_size + 1)  # Room for the final None
+        self._queues.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        """Stop receiving messages, e.g. once the client disconnected."""
+        self._queues.discard(queue)
+
+    def publish(self, message) -> None:
+        """Hand the message to every subscriber, dropping those lagging by `max_queue_size` messages."""
+        for queue in list(self._queues):
+            if queue.qsize() < self.max_queue_size:
+                queue.put_nowait(message)
+            else:
+                logger.warning(f"Dropping a subscriber lagging by {queue.qsize()} messages")
+                self._queues.discard(queue)
+                queue.put_nowait(None)
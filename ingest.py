@@ -0,0 +1,96 @@
+import io
+import json
+
+import pandas as pd
+
+REQUIRED_COLUMNS = ['name', 'datetime', 'duration_s']
+MAX_DURATION_S = 30 * 24 * 3600  # Longer durations, bulk or not, are rejected as bogus rather than overflowing or ranking first
+MEDIA_TYPES = ['application/json', 'application/x-ndjson', 'text/csv']
+
+
+class UnsupportedMediaType(ValueError):
+    pass
+
+
+def read_bulk(body: bytes, media_type: str) -> pd.DataFrame:
+    """Read uploaded records, as a JSON array, newline-delimited JSON or CSV.
+
+    Args:
+        body (bytes): The uploaded records.
+        media_type (str): Media type of the body, one of MEDIA_TYPES.
+
+    Raises:
+        UnsupportedMediaType: If the media type is not supported.
+        ValueError: If the body cannot be read in that format, or lacks a required column.
+
+    Returns:
+        pd.DataFrame: The records, one row per uploaded record, all as read.
+    """
+    if media_type == 'application/json':
+        records = json.loads(body)
+        if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+            raise ValueError("Expected a JSON array of records")
+        df = pd.DataFrame.from_records(records)
+    elif media_type == 'application/x-ndjson':
+        df = pd.read_json(io.BytesIO(body), lines=True, dtype=False, convert_dates=False) if body.strip() else pd.DataFrame()
+    elif media_type == 'text/csv':
+        df = pd.read_csv(io.BytesIO(body), dtype=str, keep_default_na=False, na_values=[''])
+    else:
+        raise UnsupportedMediaType(f"Unsupported media type: {media_type}, expected one of {MEDIA_TYPES}")
+
+    if len(df) == 0:
+        return pd.DataFrame(columns=REQUIRED_COLUMNS)
+    missing_columns = [column for column in REQUIRED_COLUMNS if column not in df.columns]
+    if missing_columns:
+        raise ValueError(f"Missing columns: {missing_columns}")
+    return df
+
+
+def validate_bulk(df: pd.DataFrame) -> tuple[list[dict], list[dict]]:
+    """Validate uploaded records in a vectorized pass over the columns.
+
+    Args:
+        df (pd.DataFrame): The records, as returned by `read_bulk`.
+
+    Returns:
+        tuple[list[dict], list[dict]]: The valid records, ready to be added to the leaderboard,
+            and the errors of the invalid ones, as {'row': 0-based index in the upload, 'errors': [...]}.
+    """
+    names = df['name'].where(df['name'].notna(), None)
+    # Numbers would otherwise be read as nanoseconds since the epoch
+    datetime_not_string = df['datetime'].notna() & ~df['datetime'].map(lambda dt: isinstance(dt, str))
+    datetimes = pd.to_datetime(
+        df['datetime'].where(~datetime_not_string, None), errors='coerce', utc=True, format='mixed'
+    ).dt.tz_localize(None)
+    # JSON booleans would otherwise be read as 0 and 1
+    durations = pd.to_numeric(df['duration_s'].map(lambda value: None if isinstance(value, bool) else value), errors='coerce')
+    avatar_urls = df['avatar_url'] if 'avatar_url' in df.columns else pd.Series(None, index=df.index, dtype=object)
+    avatar_urls = avatar_urls.astype(object).where(avatar_urls.notna(), None)
+
+    checks = {
+        "name is missing": names.isna() | (names.astype(str).str.strip() == ''),
+        "name is not a string": names.notna() & ~names.map(lambda name: isinstance(name, str)),
+        "datetime is missing or invalid": datetimes.isna() & ~datetime_not_string,
+        "datetime is not a string": datetime_not_string,
+        "duration_s is missing or not an integer": durations.isna() | (durations != durations.round()),
+        f"duration_s is not between 1 and {MAX_DURATION_S}": (durations < 1) | (durations > MAX_DURATION_S),
+        "avatar_url is not a string": avatar_urls.notna() & ~avatar_urls.map(lambda avatar_url: isinstance(avatar_url, str)),
+    }
+    invalid = pd.concat(checks, axis=1).reset_index(drop=True)
+
+    errors = [
+        {'row': int(row), 'errors': [check for check in checks if invalid.at[row, check]]}
+        for row in invalid.index[invalid.any(axis=1)]
+    ]
+
+    valid = ~invalid.any(axis=1).to_numpy()
+    records = [
+        {'name': name, 'datetime': dt, 'duration_s': duration_s, 'avatar_url': avatar_url}
+        for name, dt, duration_s, avatar_url in zip(
+            names[valid].astype(str).str.strip().tolist(),
+            datetimes[valid].array.to_pydatetime(),
+            durations[valid].astype('int64').tolist(),  # In range, so no overflow
+            avatar_urls[valid].tolist(),
+        )
+    ]
+    return records, errors
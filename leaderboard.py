@@ -0,0 +1,524 @@
+import bisect
+import heapq
+import logging
+import threading
+import unicodedata
+from collections import Counter
+from datetime import datetime, timezone
+
+from name_search import NameIndex
+from storage import Storage, to_datetime
+
+logger = logging.getLogger(__name__)
+
+MERGE_MIN_BATCH_SIZE = 256  # Batches at least this large are merged into the ranking, rather than inserted one by one
+
+
+def normalize_name(name: str) -> str:
+    """Normalize a rider's name, so that differences in case, spacing or unicode composition do not matter."""
+    return ' '.join(unicodedata.normalize('NFKC', name).casefold().split())
+
+
+def _sort_key(row: dict) -> tuple[int, datetime, int]:
+    return row['duration_s'], row['datetime'], row['id']
+
+
+class Leaderboard:
+    """Process-wide in-memory copy of the records saved on disk, kept in rank order.
+
+    The records are loaded once, served from memory, and updated in place by the writers.
+    Records are ordered by (duration_s, datetime), ties going to the earliest submission:
+    a record's rank is its position in that order, so a new record is placed with a binary search
+    in O(log n) and the ranks below it shift implicitly.
+    If the storage is modified by another process, the in-memory copy is invalidated
+    and reloaded on the next access.
+
+    On top of the ranking, indexes are maintained on every insertion:
+    - the `top_k_size` best records, so that the podium is served without touching the whole ranking.
+    - the records of each rider, by normalized name, so that a rider is looked up without scanning the ranking.
+    - a search index over the riders' names.
+    - the records sorted by datetime, and the records of each year in rank order,
+      so that rankings restricted to a time range or a season are served without re-sorting everything.
+    - summaries of the durations (sum, histogram with `histogram_bucket_s` wide buckets) and records per month.
+    - the ids of the (at least) `change_history_size` last added records, as a change feed (see `changes`).
+    """
+
+    def __init__(
+        self, storage: Storage, top_k_size: int = 10, histogram_bucket_s: int = 3600, change_history_size: int = 10000
+    ):
+        self.storage = storage
+        self.top_k_size = top_k_size
+        self.histogram_bucket_s = histogram_bucket_s
+        self.change_history_size = change_history_size
+        self._keys = []  # (duration_s, datetime, id), sorted
+        self._rows = []  # Records without their rank, in the same order as self._keys
+        self._top_keys = []  # The top_k_size first keys of self._keys
+        self._top_rows = []  # Records in the same order as self._top_keys
+        self._rider_keys = {}  # Normalized name -> sorted keys of the rider's records
+        self._rows_by_id = {}  # id -> record
+        self._name_index = NameIndex()
+        self._datetime_index = []  # (datetime, id), sorted
+        self._year_keys = {}  # Year -> sorted keys of the year's records
+        self._duration_sum = 0
+        self._duration_histogram = Counter()  # Bucket -> number of records
+        self._month_counts = Counter()  # 'YYYY-MM' -> number of records
+        self._next_id = 1
+        self._change_ids = []  # Ids of the last added records, in the order they were added
+        self._changes_since = 0  # Sequence number from which the changes are known, i.e. preceding self._change_ids
+        self._version = 0  # Bumped whenever the records change
+        self._last_modified = None  # When the records last changed
+        self._signature = None
+        self._n_loads = 0  # Number of times the records were (re)loaded from storage
+        self._lock = threading.Lock()
+
+    def _refresh(self) -> None:
+        signature = self.storage.signature()
+        if signature != self._signature:
+            logger.info("Loading records from storage")
+            rows = self.storage.load()
+            rows.sort(key=_sort_key)
+            self._rows = rows
+            self._keys = [_sort_key(row) for row in rows]
+            self._next_id = max((row['id'] for row in rows), default=0) + 1
+            self._reindex()
+            # Changed outside of this process, the changes are only known from now on
+            self._change_ids = []
+            self._changes_since = self._next_id - 1
+            self._version += 1
+            self._last_modified = datetime.now(timezone.utc)
+            self._signature = signature
+            self._n_loads += 1
+
+    def _reindex(self) -> None:
+        self._top_keys = self._keys[:self.top_k_size]
+        self._top_rows = self._rows[:self.top_k_size]
+
+        self._rider_keys = {}
+        self._rows_by_id = {}
+        for key, row in zip(self._keys, self._rows):
+            self._rider_keys.setdefault(normalize_name(row['name']), []).append(key)
+            self._rows_by_id[row['id']] = row
+
+        self._name_index = NameIndex()
+        for rider in self._rider_keys:
+            self._name_index.add(rider)
+
+        self._datetime_index = sorted((row['datetime'], row['id']) for row in self._rows)
+        self._year_keys = {}
+        for key in self._keys:
+            self._year_keys.setdefault(key[1].year, []).append(key)
+
+        self._duration_sum = sum(key[0] for key in self._keys)
+        self._duration_histogram = Counter(key[0] // self.histogram_bucket_s for key in self._keys)
+        self._month_counts = Counter(f"{key[1]:%Y-%m}" for key in self._keys)
+
+    def _index(self, key: tuple[int, datetime, int], row: dict) -> None:
+        # Riders
+        rider = normalize_name(row['name'])
+        bisect.insort(self._rider_keys.setdefault(rider, []), key)
+        self._rows_by_id[row['id']] = row
+        self._name_index.add(rider)
+
+        # Summaries
+        self._duration_sum += key[0]
+        self._duration_histogram[key[0] // self.histogram_bucket_s] += 1
+        self._month_counts[f"{key[1]:%Y-%m}"] += 1
+
+    def _insert(self, keys: list[tuple[int, datetime, int]], rows: list[dict]) -> None:
+        for key, row in zip(keys, rows):
+            self._index(key, row)
+
+        if len(keys) < MERGE_MIN_BATCH_SIZE:
+            # Binary insertion of each record into the sorted lists
+            for key, row in zip(keys, rows):
+                i = bisect.bisect_left(self._keys, key)
+                self._keys.insert(i, key)
+                self._rows.insert(i, row)
+
+                # Top-k, in O(log k) unless the record makes it into the top-k
+                if len(self._top_keys) < self.top_k_size or key < self._top_keys[-1]:
+                    i = bisect.bisect_left(self._top_keys, key)
+                    self._top_keys.insert(i, key)
+                    self._top_rows.insert(i, row)
+                    del self._top_keys[self.top_k_size:], self._top_rows[self.top_k_size:]
+
+                bisect.insort(self._datetime_index, (row['datetime'], row['id']))
+                bisect.insort(self._year_keys.setdefault(key[1].year, []), key)
+            return
+
+        # Merge of the batch into the sorted lists: sorting a sorted list extended by a sorted batch
+        # only merges the two runs (Timsort), so this is O(n + m log m) rather than O(n * m)
+        sorted_keys = sorted(keys)
+        self._keys.extend(sorted_keys)
+        self._keys.sort()
+        self._rows = [self._rows_by_id[key[2]] for key in self._keys]
+
+        self._top_keys = sorted(self._top_keys + sorted_keys[:self.top_k_size])[:self.top_k_size]
+        self._top_rows = [self._rows_by_id[key[2]] for key in self._top_keys]
+
+        self._datetime_index.extend(sorted((row['datetime'], row['id']) for row in rows))
+        self._datetime_index.sort()
+        years = set()
+        for key in sorted_keys:
+            self._year_keys.setdefault(key[1].year, []).append(key)
+            years.add(key[1].year)
+        for year in years:
+            self._year_keys[year].sort()
+
+    def state(self) -> tuple[int, datetime]:
+        """Get the version of the records, bumped whenever they change, and when they last changed.
+
+        Returns:
+            tuple[int, datetime]: The version, and the (UTC) datetime of the last change.
+        """
+        with self._lock:
+            self._refresh()
+            return self._version, self._last_modified
+
+    def records(self, start: int = 0, stop: int | None = None) -> list[dict]:
+        """Get the records in rank order, reloading them from storage if it changed since the last load.
+
+        Args:
+            start (int, optional): Index (0-based) of the first record to return. Defaults to 0.
+            stop (int | None, optional): Index (0-based, exclusive) of the last record to return. Defaults to None.
+
+        Returns:
+            list[dict]: The records, with their rank.
+        """
+        with self._lock:
+            self._refresh()
+            start, stop, _ = slice(start, stop).indices(len(self._rows))
+            return [{'rank': i + 1, **self._rows[i]} for i in range(start, stop)]
+
+    def changes(self, since: int) -> tuple[int, list[dict] | None]:
+        """Get the records added after a sequence number, for clients keeping a copy of the leaderboard in sync.
+
+        Records are only ever added, and get increasing ids as they are committed, so a record's id is its sequence number.
+        Only the last `change_history_size` changes are kept, and none from before the records were last (re)loaded
+        from storage, e.g. after another process modified them.
+
+        Args:
+            since (int): The sequence number the client is in sync with, i.e. the latest one it got.
+
+        Returns:
+            tuple[int, list[dict] | None]: The latest sequence number, and the records added after `since`, with their
+                current rank, in rank order: inserting each at its rank, in turn, yields the current leaderboard.
+                None if these changes are not known anymore, in which case the client must fetch the whole leaderboard
+                again (resync).
+        """
+        with self._lock:
+            self._refresh()
+            seq = self._next_id - 1
+            if not self._changes_since <= since <= seq:
+                return seq, None
+            start = bisect.bisect_right(self._change_ids, since)
+            rows = sorted((self._rows_by_id[id] for id in self._change_ids[start:]), key=_sort_key)
+            return seq, [{'rank': bisect.bisect_left(self._keys, _sort_key(row)) + 1, **row} for row in rows]
+
+    def _duration_quantile(self, q: float) -> float:
+        # Exact, by position in the ranking, interpolating between the two closest records
+        position = q * (len(self._keys) - 1)
+        below = int(position)
+        above = min(below + 1, len(self._keys) - 1)
+        return self._keys[below][0] + (position - below) * (self._keys[above][0] - self._keys[below][0])
+
+    def stats(self) -> dict:
+        """Get statistics about the records, in O(buckets + months) from the maintained summaries.
+
+        Quantiles are read by position in the ranking, which is sorted by duration, so they are exact.
+
+        Returns:
+            dict: The number of records, the fastest record, the mean/median/p90 duration,
+                the histogram of the durations, and the number of records per month.
+        """
+        with self._lock:
+            self._refresh()
+            n = len(self._keys)
+            if n == 0:
+                return {
+                    'count': 0,
+                    'fastest': None,
+                    'mean_duration_s': None,
+                    'median_duration_s': None,
+                    'p90_duration_s': None,
+                    'duration_histogram': [],
+                    'records_per_month': {},
+                }
+            return {
+                'count': n,
+                'fastest': {'rank': 1, **self._rows[0]},
+                'mean_duration_s': self._duration_sum / n,
+                'median_duration_s': self._duration_quantile(0.5),
+                'p90_duration_s': self._duration_quantile(0.9),
+                'duration_histogram': [
+                    {
+                        'from_s': bucket * self.histogram_bucket_s,
+                        'to_s': (bucket + 1) * self.histogram_bucket_s,
+                        'count': count,
+                    }
+                    for bucket, count in sorted(self._duration_histogram.items())
+                ],
+                'records_per_month': dict(sorted(self._month_counts.items())),
+            }
+
+    def top(self, k: int) -> list[dict]:
+        """Get the k best records from the maintained top-k, in O(k).
+
+        Args:
+            k (int): Number of records to return, at most `top_k_size`.
+
+        Raises:
+            ValueError: If k is larger than `top_k_size`.
+
+        Returns:
+            list[dict]: The records, with their rank.
+        """
+        if k > self.top_k_size:
+            raise ValueError(f"Only the top {self.top_k_size} records are maintained")
+        with self._lock:
+            self._refresh()
+            return [{'rank': i + 1, **row} for i, row in enumerate(self._top_rows[:k])]
+
+    def rider(self, name: str) -> dict | None:
+        """Look up a rider's records, in O(1) plus O(log n) per record to get its rank.
+
+        Args:
+            name (str): The rider's name, normalized with `normalize_name` before the lookup.
+
+        Returns:
+            dict | None: The rider's best rank, their percentile (share of the records ranked at or below
+                their best, in %), and all their records with their rank, best first. None if the rider is unknown.
+        """
+        with self._lock:
+            self._refresh()
+            keys = self._rider_keys.get(normalize_name(name))
+            if not keys:
+                return None
+
+            attempts = [
+                {'rank': bisect.bisect_left(self._keys, key) + 1, **self._rows_by_id[key[2]]}
+                for key in keys
+            ]
+            best_rank = attempts[0]['rank']
+            return {
+                'name': attempts[0]['name'],
+                'best_rank': best_rank,
+                'percentile': round(100 * (len(self._keys) - best_rank + 1) / len(self._keys), 2),
+                'attempts': attempts,
+            }
+
+    def search(self, query: str, limit: int) -> list[dict]:
+        """Search riders by (partial, misspelled) name, regardless of case and accents.
+
+        Matches are ordered by match quality (exact name, name prefix, word prefix, fuzzy), then by their best record.
+
+        Args:
+            query (str): The (partial) name to search for.
+            limit (int): Maximum number of riders to return.
+
+        Returns:
+            list[dict]: The matching riders, with their name, best rank and number of attempts.
+        """
+        with self._lock:
+            self._refresh()
+            matches = self._name_index.search(query)
+            # Partial selection, as a short prefix matches a good share of the riders
+            riders = heapq.nsmallest(
+                limit,
+                matches,
+                key=lambda rider: (matches[rider][0], -matches[rider][1], self._rider_keys[rider][0]),
+            )
+
+            results = []
+            for rider in riders:
+                best_key = self._rider_keys[rider][0]
+                results.append({
+                    'name': self._rows_by_id[best_key[2]]['name'],
+                    'best_rank': bisect.bisect_left(self._keys, best_key) + 1,
+                    'n_attempts': len(self._rider_keys[rider]),
+                })
+            return results
+
+    def between(self, start: datetime | None = None, end: datetime | None = None) -> list[dict]:
+        """Get the ranking of the records within a time range, in O(log n + m log m) for m records in the range.
+
+        Args:
+            start (datetime | None, optional): Datetime from which to consider records (inclusive). Defaults to None.
+            end (datetime | None, optional): Datetime until which to consider records (exclusive). Defaults to None.
+
+        Returns:
+            list[dict]: The records within the time range, with their rank within it.
+        """
+        with self._lock:
+            self._refresh()
+            lo = 0 if start is None else bisect.bisect_left(self._datetime_index, (start,))
+            hi = len(self._datetime_index) if end is None else bisect.bisect_left(self._datetime_index, (end,))
+            rows = sorted((self._rows_by_id[id] for _, id in self._datetime_index[lo:hi]), key=_sort_key)
+            return [{'rank': i + 1, **row} for i, row in enumerate(rows)]
+
+    def season(self, year: int) -> list[dict]:
+        """Get the ranking of a year's records, maintained as records are added.
+
+        Args:
+            year (int): The year.
+
+        Returns:
+            list[dict]: The year's records, with their rank within the year.
+        """
+        with self._lock:
+            self._refresh()
+            keys = self._year_keys.get(year, [])
+            return [{'rank': i + 1, **self._rows_by_id[key[2]]} for i, key in enumerate(keys)]
+
+    def around(self, radius: int, rank: int | None = None, id: int | None = None) -> tuple[int, list[dict]] | None:
+        """Get the records surrounding a rank or a record, in O(log n + radius).
+
+        Args:
+            radius (int): Number of records to return on each side.
+            rank (int | None, optional): Rank at the center of the window. Defaults to None.
+            id (int | None, optional): Id of the record at the center of the window, if no rank is given. Defaults to None.
+
+        Returns:
+            tuple[int, list[dict]] | None: The rank at the center, and the records of the window with their rank.
+                None if there is no such rank/record.
+        """
+        with self._lock:
+            self._refresh()
+            if rank is not None:
+                if not 1 <= rank <= len(self._rows):
+                    return None
+                i = rank - 1
+            else:
+                row = self._rows_by_id.get(id)
+                if row is None:
+                    return None
+                i = bisect.bisect_left(self._keys, _sort_key(row))
+
+            start, stop = max(0, i - radius), min(len(self._rows), i + radius + 1)
+            return i + 1, [{'rank': j + 1, **self._rows[j]} for j in range(start, stop)]
+
+    def page(
+        self,
+        limit: int,
+        after: tuple[int, datetime, int] | None = None,
+        from_rank: int = 1,
+        to_rank: int | None = None,
+    ) -> tuple[list[dict], tuple[int, datetime, int] | None]:
+        """Get a page of records in rank order, in O(log n + limit).
+
+        Pages are delimited by the sort key of their last record rather than by a position,
+        so that records inserted meanwhile neither repeat nor skip records on the next page.
+
+        Args:
+            limit (int): Maximum number of records to return.
+            after (tuple[int, datetime, int] | None, optional): Sort key of the last record of the previous page.
+                Defaults to None, i.e. the first page.
+            from_rank (int, optional): Rank of the first record to consider. Defaults to 1.
+            to_rank (int | None, optional): Rank of the last record to consider (inclusive). Defaults to None, i.e. the last.
+
+        Returns:
+            tuple[list[dict], tuple[int, datetime, int] | None]: The records with their rank,
+                and the sort key to fetch the next page with, or None if this is the last page.
+        """
+        with self._lock:
+            self._refresh()
+            start = from_rank - 1
+            if after is not None:
+                start = max(start, bisect.bisect_right(self._keys, after))
+            stop = len(self._rows) if to_rank is None else min(to_rank, len(self._rows))
+            end = min(start + limit, stop)
+
+            records = [{'rank': i + 1, **self._rows[i]} for i in range(start, end)]
+            next_after = self._keys[end - 1] if start < end < stop else None
+            return records, next_after
+
+    def add(self, records: list[dict]) -> tuple[int, list[dict]]:
+        """Insert the records at their rank and append them to storage.
+
+        Small batches are inserted record by record with a binary search,
+        large ones (at least MERGE_MIN_BATCH_SIZE records) are sorted and merged in one pass.
+
+        Args:
+            records (list[dict]): Records to add, with keys 'name', 'datetime', 'duration_s' and 'avatar_url'.
+
+        Returns:
+            tuple[int, list[dict]]: The version of the leaderboard with the records inserted,
+                and the inserted records, with their id and their rank once they are all inserted.
+        """
+        with self._lock:
+            self._refresh()
+            rows = []
+            for record in records:
+                rows.append({
+                    'id': self._next_id,
+                    'name': record['name'],
+                    'datetime': to_datetime(record['datetime']),
+                    'duration_s': int(record['duration_s']),
+                    'avatar_url': record.get('avatar_url'),
+                })
+                self._next_id += 1
+            self.storage.append(rows)
+            self._signature = self.storage.signature()
+
+            keys = [_sort_key(row) for row in rows]
+            self._insert(keys, rows)
+            self._change_ids.extend(row['id'] for row in rows)
+            if len(self._change_ids) > 2 * self.change_history_size:  # Trimmed in bulk, for an amortized O(1)
+                n_forgotten = len(self._change_ids) - self.change_history_size
+                self._changes_since = self._change_ids[n_forgotten - 1]
+                del self._change_ids[:n_forgotten]
+            self._version += 1
+            self._last_modified = datetime.now(timezone.utc)
+
+            # Ranks are only final once the whole batch is inserted
+            return self._version, [
+                {'rank': bisect.bisect_left(self._keys, key) + 1, **row} for key, row in zip(keys, rows)
+            ]
+
+    def compact(self) -> None:
+        """Fold the records appended to storage since the last compaction into a new snapshot.
+
+        The lock is only held to seal the log and to swap the new snapshot in: the snapshot is written from
+        a shallow copy of the ranking (records are never modified in place), while reads and writes go on.
+        """
+        with self._lock:
+            self._refresh()
+            if not self.storage.seal():
+                return
+            self._signature = self.storage.signature()
+            n_loads = self._n_loads
+            rows = list(self._rows)
+
+        logger.info(f"Compacting {self.storage.n_logged} logged records into the snapshot")
+        self.storage.write_compacted(rows)
+
+        with self._lock:
+            if self._n_loads != n_loads or self.storage.signature() != self._signature:
+                # Modified by another process meanwhile: the sealed log is kept, and folded by the next compaction
+                logger.warning("Records changed during the compaction, not swapping the new snapshot in")
+                return
+            self.storage.swap_compacted()
+            self._signature = self.storage.signature()
+
+
+class Compactor(threading.Thread):
+    """Background thread periodically compacting the leaderboard's storage."""
+
+    def __init__(self, leaderboard: Leaderboard, interval_s: float):
+        super().__init__(name="compactor", daemon=True)
+        self.leaderboard = leaderboard
+        self.interval_s = interval_s
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval_s):
+            try:
+                self.leaderboard.compact()
+            except Exception as e:
+                logger.error(f"Error compacting records: {e}")
+
+    def stop(self) -> None:
+        """Stop the thread, and run a last compaction."""
+        self._stop_event.set()
+        self.join()
+        self.leaderboard.compact()
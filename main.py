@@ -1,24 +1,83 @@
+import asyncio
+import base64
+import csv
+import io
+import json
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
 
-from fastapi import FastAPI, HTTPException
+import msgspec
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, WebSocketException, status
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import pandas as pd
+from fastapi.responses import StreamingResponse
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Literal
 
-RECORDS_FILEPATH = Path('data/records.csv')
+from commit_queue import CommitQueue
+from events import Broadcaster, format_sse
+from ingest import UnsupportedMediaType, read_bulk, validate_bulk
+from leaderboard import Compactor, Leaderboard
+from response_cache import ResponseCache
+from serialization import MsgspecJSONResponse, Record, decode_record, dump_json, json_schema
+from storage import COLUMNS, make_storage, to_datetime
+from subscriptions import RankWindow, RiderView, SubscriptionHub
+from synthetic import generate_records
 
-# Create empty records if the records is empty.
-if not RECORDS_FILEPATH.is_file():
-    df = pd.DataFrame({
-        'rank': pd.Series(dtype='int'),
-        'name': pd.Series(dtype='string'),
-        'datetime': pd.Series(dtype='datetime64[ns]'),
-        'duration_s': pd.Series(dtype='int'),
-        'avatar_url': pd.Series(dtype='string'),
-    })
-    df.to_csv(RECORDS_FILEPATH, index=False)
+DATA_DIRPATH = Path('data')
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'csv')  # 'csv', 'arrow', 'parquet', 'bin' or 'sqlite', see make_storage
+STORAGE_THREADS = int(os.environ.get('STORAGE_THREADS', 4))
+PODIUM_MAX_K = int(os.environ.get('PODIUM_MAX_K', 10))
+COMPACTION_INTERVAL_S = 60
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+EXPORT_CHUNK_SIZE = 1000
+MAX_AROUND_RADIUS = 50
+MAX_SEARCH_LIMIT = 100
+MAX_DUMMY_RECORDS = 1_000_000
+COMMIT_MAX_BATCH_SIZE = 1000
+EVENTS_MAX_LAG = 100  # Commits an event stream's client may lag behind before being dropped
+EVENTS_HEARTBEAT_S = 15
+LIVE_MAX_LAG = 100  # Messages a live view's subscriber may lag behind before being dropped
+CHANGE_HISTORY_SIZE = 10_000  # Changes kept for GET /records/changes, clients further behind must resync
+
+# Records are loaded once and then served from memory.
+# With the CSV backend, new records are appended to a log, periodically folded into data/records.csv.
+leaderboard = Leaderboard(
+    make_storage(STORAGE_BACKEND, DATA_DIRPATH), top_k_size=PODIUM_MAX_K, change_history_size=CHANGE_HISTORY_SIZE
+)
+
+# Calls to the leaderboard may block on disk I/O or on its lock (e.g. during a compaction),
+# so they run in a dedicated bounded thread pool rather than on the event loop
+storage_executor = ThreadPoolExecutor(max_workers=STORAGE_THREADS, thread_name_prefix="storage")
+response_cache = ResponseCache(leaderboard)
+
+# All additions go through a single writer, committing concurrent submissions together
+commit_queue = CommitQueue(leaderboard, storage_executor, max_batch_size=COMMIT_MAX_BATCH_SIZE)
+
+# Committed records are pushed to the clients of GET /records/events, through one shared broadcaster
+record_events = Broadcaster(max_queue_size=EVENTS_MAX_LAG)
+
+def publish_record_events(version: int, records: list[dict]) -> None:
+    """Publish one 'record' event per committed record, serialized once for all the subscribers.
+
+    Events are in rank order, so that inserting each record at its rank, in turn, yields the committed leaderboard.
+    """
+    if not record_events:
+        return
+    record_events.publish(b"".join(
+        format_sse(dump_json({"version": version, "rank": record['rank'], "record": record}), event="record", id=str(version))
+        for record in sorted(records, key=lambda record: record['rank'])
+    ))
+
+commit_queue.add_listener(publish_record_events)
+
+# Live views of the leaderboard, updated with deltas over WebSocket /records/live
+live_views = SubscriptionHub(leaderboard, storage_executor, max_queue_size=LIVE_MAX_LAG)
+commit_queue.add_listener(live_views.on_commit)
 
 # Setup logging
 logging.basicConfig(
@@ -30,7 +89,21 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="[Swiss Cycling North-to-South Challenge] Backend")
+async def run_blocking(fn, *args, **kwargs):
+    """Run a blocking call in the storage thread pool, without blocking the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(storage_executor, partial(fn, *args, **kwargs))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    compactor = Compactor(leaderboard, interval_s=COMPACTION_INTERVAL_S)
+    compactor.start()
+    commit_queue.start()
+    yield
+    await commit_queue.stop()
+    compactor.stop()
+    storage_executor.shutdown()
+
+app = FastAPI(title="[Swiss Cycling North-to-South Challenge] Backend", lifespan=lifespan)
 
 # CORS configuration
 app.add_middleware(
@@ -41,133 +114,534 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
-class Record(BaseModel):
-    name: str
-    datetime: str  # Use a string for simplicity; can be parsed to datetime later
-    duration_s: int
-
 @app.get("/")
 async def get_root():
     logger.info(f"Received GET /")
     return {"message": "Welcome to the Swiss Cycling North-to-South Backend!"}
 
+def encode_cursor(key: tuple[int, datetime, int]) -> str:
+    duration_s, dt, id = key
+    return base64.urlsafe_b64encode(json.dumps([duration_s, dt.isoformat(), id]).encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple[int, datetime, int]:
+    duration_s, dt, id = json.loads(base64.urlsafe_b64decode(cursor))
+    return int(duration_s), datetime.fromisoformat(dt), int(id)
+
+def parse_datetime_bound(value: str, end: bool) -> datetime:
+    """Parse the bound of a time range. A date (e.g. 2023-12-31) as end bound includes that whole day.
+
+    Raises:
+        HTTPException: 400 error if the value cannot be parsed.
+    """
+    try:
+        parsed = to_datetime(value)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid datetime: {e}")
+
+    is_date = len(value) == len("YYYY-MM-DD")
+    return parsed + timedelta(days=1) if end and is_date else parsed
+
 @app.get("/records")
-async def get_records():
-    """Get all the records saved on disk.
+async def get_records(
+    request: Request,
+    limit: int | None = Query(default=None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    from_rank: int | None = Query(default=None, ge=1),
+    to_rank: int | None = Query(default=None, ge=1),
+    from_: str | None = Query(default=None, alias="from"),
+    to: str | None = Query(default=None),
+):
+    """Get all the records saved on disk, or a page of them, or the ranking within a time range.
+
+    Without parameters, the whole leaderboard is returned, and 304 Not Modified is answered
+    if the client's copy (If-None-Match/If-Modified-Since) is up to date.
+    With `from`/`to`, the records within that time range are returned, ranked among themselves.
+    With any of the other parameters, a page of at most `limit` records is returned, with the `next_cursor`
+    to pass as `cursor` to get the next page (None on the last page). The cursor stays valid while records are added.
+
+    Args:
+        limit (int | None, optional): Maximum number of records in the page. Defaults to DEFAULT_PAGE_SIZE.
+        cursor (str | None, optional): The `next_cursor` of the previous page. Defaults to None, i.e. the first page.
+        from_rank (int | None, optional): Only return records ranked from `from_rank`. Defaults to None.
+        to_rank (int | None, optional): Only return records ranked up to `to_rank` (inclusive). Defaults to None.
+        from_ (str | None, optional): `from`, only rank records from this date/datetime (inclusive). Defaults to None.
+        to (str | None, optional): Only rank records until this date (inclusive) or datetime (exclusive). Defaults to None.
 
     Raises:
+        HTTPException: 400 error if the cursor or a datetime is invalid.
         HTTPException: 500 error if there is an issue loading the records.
     """
     logger.info("Received GET /records")
 
-    # Load current records
+    if from_ is not None or to is not None:
+        start = None if from_ is None else parse_datetime_bound(from_, end=False)
+        end = None if to is None else parse_datetime_bound(to, end=True)
+        try:
+            records = await run_blocking(leaderboard.between, start, end)
+        except Exception as e:
+            logger.error(f"Error loading records: {e}")
+            raise HTTPException(status_code=500, detail="Error loading records.")
+        return MsgspecJSONResponse({"records": records})
+
+    if limit is not None or cursor is not None or from_rank is not None or to_rank is not None:
+        try:
+            after = None if cursor is None else decode_cursor(cursor)
+        except (ValueError, TypeError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid cursor: {e}")
+
+        try:
+            records, next_after = await run_blocking(
+                leaderboard.page,
+                limit=limit or DEFAULT_PAGE_SIZE,
+                after=after,
+                from_rank=from_rank or 1,
+                to_rank=to_rank,
+            )
+        except Exception as e:
+            logger.error(f"Error loading records: {e}")
+            raise HTTPException(status_code=500, detail="Error loading records.")
+
+        next_cursor = None if next_after is None else encode_cursor(next_after)
+        return MsgspecJSONResponse({"records": records, "next_cursor": next_cursor})
+
+    # Serve the cached body, only rebuilt after a write
     try:
-        df = pd.read_csv(RECORDS_FILEPATH)
+        return await run_blocking(response_cache.response, request, "records", lambda: {"records": leaderboard.records()})
+    except Exception as e:
+        logger.error(f"Error loading records: {e}")
+        raise HTTPException(status_code=500, detail="Error loading records.")
+
+async def iter_export(format: str):
+    """Yield the leaderboard page by page, as NDJSON or CSV chunks, so that memory use does not grow with it."""
+    if format == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=COLUMNS, lineterminator="\n")
+        writer.writeheader()
+
+    after = None
+    while True:
+        records, after = await run_blocking(leaderboard.page, limit=EXPORT_CHUNK_SIZE, after=after)
+        if format == "csv":
+            writer.writerows(records)
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        else:
+            yield b"".join(dump_json(record) + b"\n" for record in records)
+        if after is None:
+            return
+
+@app.get("/records/events")
+async def get_records_events():
+    """Stream the records as they are committed, as Server-Sent Events, instead of polling the leaderboard.
+
+    Each committed record is sent as a 'record' event, whose data is {"version", "rank", "record"}
+    and whose id is the leaderboard's version once committed. A comment is sent every EVENTS_HEARTBEAT_S
+    to keep the connection open through proxies. A client lagging EVENTS_MAX_LAG commits behind is disconnected,
+    and should refetch the leaderboard once reconnected.
+    """
+    logger.info("Received GET /records/events")
+
+    queue = record_events.subscribe()
+
+    async def stream():
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                try:
+                    events = await asyncio.wait_for(queue.get(), timeout=EVENTS_HEARTBEAT_S)
+                except asyncio.TimeoutError:
+                    yield b": heartbeat\n\n"
+                    continue
+                if events is None:  # Dropped for lagging behind
+                    return
+                yield events
+        finally:
+            record_events.unsubscribe(queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},  # Not buffered by proxies such as nginx
+    )
+
+@app.websocket("/records/live")
+async def records_live(
+    websocket: WebSocket,
+    view: Literal["podium", "window", "rider"],
+    k: int = Query(default=3, ge=1, le=MAX_PAGE_SIZE),
+    from_rank: int = Query(default=1, ge=1),
+    to_rank: int | None = Query(default=None, ge=1),
+    name: str | None = None,
+):
+    """Subscribe to a live view of the leaderboard: sent whole once, then kept up to date with deltas.
+
+    The view is the podium (`k` best records), a window of ranks (`from_rank` to `to_rank`),
+    both of at most MAX_PAGE_SIZE records, or a rider's records (`name`). Messages are JSON, with a 'type' and the leaderboard's 'version':
+    - 'snapshot': the whole view, as 'records' (podium/window) or 'rider' (as GET /riders/{name}, but only with the rider's
+      'name' and 'attempts', as their best rank and percentile would change with every record added below them).
+    - 'delta': 'ops' to apply in order, each {'rank': r, 'record': record or null}: the ranks >= r are shifted by +1,
+      and then the record (if any) is inserted at rank r. Records shifted past the end of a window leave it.
+    A client lagging LIVE_MAX_LAG messages behind is disconnected (close code 1013), and should subscribe again.
+
+    Args:
+        view (Literal["podium", "window", "rider"]): The kind of view.
+        k (int, optional): Size of the podium. Defaults to 3.
+        from_rank (int, optional): First rank of the window. Defaults to 1.
+        to_rank (int | None, optional): Last rank (inclusive) of the window. Defaults to None.
+        name (str | None, optional): The rider's name. Defaults to None.
+
+    Raises:
+        WebSocketException: 1008 (policy violation) if the view's parameters are missing or invalid.
+    """
+    logger.info(f"Received WebSocket /records/live with view: {view}")
+
+    if view == "podium":
+        live_view = RankWindow(1, k)
+    elif view == "window":
+        if to_rank is None or not from_rank <= to_rank < from_rank + MAX_PAGE_SIZE:
+            raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=f"Invalid window, at most {MAX_PAGE_SIZE} ranks")
+        live_view = RankWindow(from_rank, to_rank)
+    else:
+        if not name:
+            raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="Missing rider name")
+        live_view = RiderView(name)
+
+    await websocket.accept()
+    queue = live_views.subscribe(live_view)
+
+    async def send_messages():
+        version, snapshot = await run_blocking(live_views.snapshot, live_view)
+        await websocket.send_text(snapshot.decode())
+        while True:
+            message = await queue.get()
+            if message is None:  # Dropped for lagging behind
+                await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="Too slow, subscribe again")
+                return
+            message_version, body = message
+            if message_version <= version:  # Already in the snapshot
+                continue
+            if body is None:  # Resync
+                version, body = await run_blocking(live_views.snapshot, live_view)
+            await websocket.send_text(body.decode())
+
+    async def wait_for_disconnect():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    # Whichever ends first ends the subscription, e.g. a client disconnecting while no delta is being sent
+    tasks = [asyncio.create_task(send_messages()), asyncio.create_task(wait_for_disconnect())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if not isinstance(task.exception(), (WebSocketDisconnect, type(None))):
+                logger.error(f"Error in live view: {task.exception()}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        live_views.unsubscribe(live_view, queue)
+
+@app.get("/records/changes")
+async def get_records_changes(since: int = Query(ge=0)):
+    """Get the records added since a sequence number, to keep a copy of the leaderboard in sync with tiny requests.
+
+    Every added record gets the next sequence number (its id). The client passes the latest `seq` it got,
+    and inserts the returned records into its copy, each at its rank, in the order they are returned (rank order,
+    inserting them in the order they were added would misplace them). If `resync` is true, the changes since then
+    are not known anymore (too old, or the records were modified outside of the backend), and the client must fetch
+    GET /records again.
+
+    Args:
+        since (int): The latest sequence number the client got.
+
+    Raises:
+        HTTPException: 500 error if there is an issue loading the records.
+
+    Returns:
+        dict: The latest sequence number `seq`, whether to `resync`, and the added `records`, with their current rank.
+    """
+    logger.info(f"Received GET /records/changes with since: {since}")
+
+    try:
+        seq, records = await run_blocking(leaderboard.changes, since)
+    except Exception as e:
+        logger.error(f"Error loading records: {e}")
+        raise HTTPException(status_code=500, detail="Error loading records.")
+
+    return MsgspecJSONResponse({"seq": seq, "resync": records is None, "records": records or []})
+
+@app.get("/records/export")
+async def get_records_export(format: Literal["ndjson", "csv"] = "ndjson"):
+    """Stream the whole leaderboard, meant for bulk consumers.
+
+    The records are read from the leaderboard and sent chunk by chunk,
+    so memory use and time-to-first-byte do not grow with the leaderboard.
+
+    Args:
+        format (Literal["ndjson", "csv"], optional): Newline-delimited JSON or CSV. Defaults to "ndjson".
+    """
+    logger.info(f"Received GET /records/export with format: {format}")
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(iter_export(format), media_type=media_type)
+
+def parse_bulk(body: bytes, media_type: str) -> tuple[list[dict], list[dict]]:
+    return validate_bulk(read_bulk(body, media_type))
+
+@app.post("/records/bulk")
+async def post_records_bulk(request: Request):
+    """Add many records at once, e.g. to import historic rides.
+
+    The body is either a JSON array of records (application/json), newline-delimited JSON (application/x-ndjson)
+    or CSV with a header (text/csv), with the fields of POST /add-record plus an optional avatar_url.
+    The records are validated all at once, and the valid ones are merged into the leaderboard and saved in one go.
+
+    Raises:
+        HTTPException: 400 if the body cannot be read, or lacks a field.
+        HTTPException: 415 if the body's media type is not supported.
+        HTTPException: 500 if there is an issue adding the records.
+
+    Returns:
+        dict: The number of records added, and the errors of the invalid records (0-based row in the body).
+    """
+    media_type = request.headers.get("content-type", "application/json").split(";")[0].strip()
+    logger.info(f"Received POST /records/bulk with media type: {media_type}")
+
+    body = await request.body()
+    try:
+        records, errors = await run_blocking(parse_bulk, body, media_type)
+    except UnsupportedMediaType as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid records: {e}")
+
+    if records:
+        try:
+            await commit_queue.submit(records)
+        except Exception as e:
+            logger.error("Error saving records: %s", e)
+            raise HTTPException(status_code=500, detail="Error saving records")
+
+    return {"message": f"{len(records)} records added successfully", "added": len(records), "errors": errors}
+
+@app.get("/records/around")
+async def get_records_around(
+    rank: int | None = Query(default=None, ge=1),
+    id: int | None = None,
+    radius: int = Query(default=5, ge=0, le=MAX_AROUND_RADIUS),
+):
+    """Get the window of records surrounding a rank or a record, e.g. a rider's neighbours.
+
+    Args:
+        rank (int | None, optional): Rank at the center of the window. Defaults to None.
+        id (int | None, optional): Id of the record at the center of the window. Defaults to None.
+        radius (int, optional): Number of records above and below the center. Defaults to 5.
+
+    Raises:
+        HTTPException: 400 error if not exactly one of rank and id is given.
+        HTTPException: 404 error if there is no such rank/record.
+        HTTPException: 500 error if there is an issue loading the records.
+    """
+    logger.info(f"Received GET /records/around with rank: {rank}, id: {id}, radius: {radius}")
+
+    if (rank is None) == (id is None):
+        raise HTTPException(status_code=400, detail="Exactly one of rank and id must be given.")
+
+    try:
+        window = await run_blocking(leaderboard.around, radius, rank=rank, id=id)
+    except Exception as e:
+        logger.error(f"Error loading records: {e}")
+        raise HTTPException(status_code=500, detail="Error loading records.")
+
+    if window is None:
+        raise HTTPException(status_code=404, detail="No such record.")
+    center_rank, records = window
+    return MsgspecJSONResponse({"rank": center_rank, "records": records})
+
+@app.get("/leaderboards/{year}")
+async def get_leaderboard_of_year(request: Request, year: int):
+    """Get the ranking of the records of a given year (season).
+
+    Answers 304 Not Modified if the client's copy (If-None-Match/If-Modified-Since) is up to date.
+
+    Args:
+        year (int): The year.
+
+    Raises:
+        HTTPException: 500 error if there is an issue loading the records.
+    """
+    logger.info(f"Received GET /leaderboards/{year}")
+
+    # Serve the cached body, only rebuilt after a write
+    try:
+        return await run_blocking(
+            response_cache.response, request, f"season-{year}", lambda: {"year": year, "records": leaderboard.season(year)}
+        )
     except Exception as e:
         logger.error(f"Error loading records: {e}")
         raise HTTPException(status_code=500, detail="Error loading records.")
- 
-    return {"records": df.to_dict(orient='records')}
 
 @app.get("/podium")
-async def get_podium():
-    """Get the records whose rank is 1,2,3.
+async def get_podium(request: Request, k: int = Query(default=3, ge=1, le=PODIUM_MAX_K)):
+    """Get the records whose rank is 1,...,k.
+
+    The podium is served from the top-k maintained by the leaderboard, without touching the rest of the records.
+    Answers 304 Not Modified if the client's copy (If-None-Match/If-Modified-Since) is up to date.
+
+    Args:
+        k (int, optional): Size of the podium, at most PODIUM_MAX_K. Defaults to 3.
 
     Raises:
         HTTPException: 500 error if there is an issue loading the records.
     """
-    logger.info(f"Received GET /podium")
+    logger.info(f"Received GET /podium with k: {k}")
 
-    # Load current records
+    # Serve the cached body, only rebuilt after a write
     try:
-        df = pd.read_csv(RECORDS_FILEPATH)
+        return await run_blocking(response_cache.response, request, f"podium-{k}", lambda: {"podium": leaderboard.top(k)})
     except Exception as e:
         logger.error(f"Error loading records: {e}")
         raise HTTPException(status_code=500, detail="Error loading records.")
-    
-    # Only keep the top 3
-    df = df[df["rank"] <= 3]
- 
-    return {"podium": df.to_dict(orient='records')}
 
-@app.get("/add-dummy-records")
-async def get_add_dummy_records():
-    """Add 5 dummy records, meant for testing.
+@app.get("/riders/search")
+async def get_riders_search(
+    q: str = Query(min_length=1),
+    limit: int = Query(default=10, ge=1, le=MAX_SEARCH_LIMIT),
+):
+    """Search riders by name, e.g. as the user types in the leaderboard's search box.
+
+    Matching is case- and accent-insensitive, by prefix of the name or any of its words,
+    falling back to fuzzy matching if nothing matches by prefix.
+
+    Args:
+        q (str): The (partial) name to search for.
+        limit (int, optional): Maximum number of riders to return. Defaults to 10.
+
+    Raises:
+        HTTPException: 500 error if there is an issue loading the records.
+    """
+    logger.info(f"Received GET /riders/search with q: {q}")
+
+    try:
+        riders = await run_blocking(leaderboard.search, q, limit)
+    except Exception as e:
+        logger.error(f"Error loading records: {e}")
+        raise HTTPException(status_code=500, detail="Error loading records.")
+
+    return MsgspecJSONResponse({"riders": riders})
+
+@app.get("/riders/{name}")
+async def get_rider(name: str):
+    """Get where a rider stands: their best rank, percentile, and all their attempts.
+
+    Names are matched regardless of case and spacing.
+
+    Args:
+        name (str): The rider's name.
+
+    Raises:
+        HTTPException: 404 error if no record has this name.
+        HTTPException: 500 error if there is an issue loading the records.
+    """
+    logger.info(f"Received GET /riders/{name}")
+
+    try:
+        rider = await run_blocking(leaderboard.rider, name)
+    except Exception as e:
+        logger.error(f"Error loading records: {e}")
+        raise HTTPException(status_code=500, detail="Error loading records.")
+
+    if rider is None:
+        raise HTTPException(status_code=404, detail=f"No record for rider: {name}")
+    return MsgspecJSONResponse(rider)
+
+@app.get("/stats")
+async def get_stats(request: Request):
+    """Get statistics about the records: count, fastest, mean/median/p90 duration,
+    duration histogram (one-hour buckets) and records per month.
+
+    Answers 304 Not Modified if the client's copy (If-None-Match/If-Modified-Since) is up to date.
 
     Raises:
         HTTPException: 500 error if there is an issue loading the records.
-        HTTPException: 500 if there is an issue dumping the records to disk.
     """
-    logger.info(f"Received GET /add-dummy-records")
+    logger.info(f"Received GET /stats")
 
-    # Load current records
+    # Serve the cached body, only rebuilt after a write
     try:
-        df = pd.read_csv(RECORDS_FILEPATH)
+        return await run_blocking(response_cache.response, request, "stats", leaderboard.stats)
     except Exception as e:
         logger.error(f"Error loading records: {e}")
         raise HTTPException(status_code=500, detail="Error loading records.")
-    
-    SOME_AVATAR_URL = "https://avatars.githubusercontent.com/u/38256417"
-    dummy_df = pd.DataFrame({
-        "name": ["This could be you", "This could also be you!", "You again, maybe", "Maybe you tomorrow?", "A you within reach"],
-        "datetime": [datetime(2020, 10, 31), datetime(2023, 1, 1), datetime(1997, 7, 25), datetime(2017, 8, 30), datetime(2019, 8, 30)],
-        "duration_s": [60000, 50000, 72300, 30044, 80000],
-        "avatar_url": [SOME_AVATAR_URL] * 5
-    })
-    df = pd.concat([df,dummy_df], ignore_index=True)
-
-    # Recompute ranks based on 'duration_s', 'datetime'
-    df = df.sort_values(by=['duration_s', 'datetime'])
-    df['rank'] = range(1, len(df)+1)
-
-    # Save the updated DataFrame back to CSV
+
+@app.get("/add-dummy-records")
+async def get_add_dummy_records(
+    n: int = Query(default=5, ge=1, le=MAX_DUMMY_RECORDS),
+    seed: int | None = None,
+):
+    """Add synthetic records, meant for testing, see `synthetic.generate_records`.
+
+    Args:
+        n (int, optional): Number of records to add. Defaults to 5.
+        seed (int | None, optional): Seed, for reproducible records. Defaults to None.
+
+    Raises:
+        HTTPException: 500 if there is an issue adding the records.
+    """
+    logger.info(f"Received GET /add-dummy-records with n: {n}, seed: {seed}")
+
+    # Insert them at their rank, and save the leaderboard to disk
     try:
-        df.to_csv(RECORDS_FILEPATH, index=False)
+        dummy_records = await run_blocking(generate_records, n, seed=seed)
+        await commit_queue.submit(dummy_records)
     except Exception as e:
         logger.error("Error saving records: %s", e)
         raise HTTPException(status_code=500, detail="Error saving records")
 
-    return {"message": "Record added successfully", "status": 200}
+    return {"message": f"{n} records added successfully", "status": 200}
 
-@app.post("/add-record")
-async def post_add_record(record: Record):
+@app.post(
+    "/add-record",
+    openapi_extra={"requestBody": {"required": True, "content": {"application/json": {"schema": json_schema(Record)}}}},
+)
+async def post_add_record(request: Request):
     """Add the record to the list of record saved on disk.
 
+    The body, a `Record`, is decoded and validated by msgspec in a single pass, rather than by a pydantic model.
+
     Args:
-        record (Record): Record to be added.
+        request (Request): The request, whose JSON body is the record to be added.
 
     Raises:
-        HTTPException: 500 if there is an issue loading the records from disk.
-        HTTPException: 500 if there is an issue dumping the records to disk.
+        HTTPException: 422 if the body is not a valid record, or if the record's datetime cannot be parsed.
+        HTTPException: 500 if there is an issue adding the record.
+
+    Returns:
+        dict: The rank the record was inserted at.
     """
+    try:
+        record = decode_record(await request.body())
+    except msgspec.DecodeError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid record: {e}")
+
     logger.info(f"Received POST /add-record with data: {record}")
 
-    # Load current records
     try:
-        df = pd.read_csv(RECORDS_FILEPATH)
-    except Exception as e:
-        logger.error(f"Error loading records: {e}")
-        raise HTTPException(status_code=500, detail="Error loading records.")
- 
-    # Append new record
+        record_datetime = to_datetime(record.datetime)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid datetime: {e}")
+
+    # Insert the new record at its rank, and save the leaderboard to disk
     new_record = {
         'name': record.name,
-        'datetime': pd.to_datetime(record.datetime),
+        'datetime': record_datetime,
         'duration_s': record.duration_s,
-        'avatar_url': pd.Series(dtype='string'),
+        'avatar_url': None,
     }
-    df = pd.concat([df, pd.DataFrame(new_record)], ignore_index=True)
-
-    # Recompute ranks based on 'duration_s', 'datetime'
-    df = df.sort_values(by=['duration_s', 'datetime'])
-    df['rank'] = range(1, len(df)+1)
-
-    # Save the updated DataFrame back to CSV
     try:
-        df.to_csv(RECORDS_FILEPATH, index=False)
+        [rank] = await commit_queue.submit([new_record])
     except Exception as e:
         logger.error("Error saving records: %s", e)
         raise HTTPException(status_code=500, detail="Error saving records")
 
-    return {"message": "Record added successfully", "status": 200}
-
+    return {"message": "Record added successfully", "status": 200, "rank": rank}
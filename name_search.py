@@ -0,0 +1,112 @@
+import math
+import unicodedata
+
+MIN_SIMILARITY = 0.3  # Minimum trigram similarity for a fuzzy match
+
+# Match quality, best first
+EXACT, PREFIX, WORD_PREFIX, FUZZY = range(4)
+
+
+def fold(text: str) -> str:
+    """Fold a text for searching: accents stripped (e.g. ü -> u), casefolded, and whitespace collapsed."""
+    if not text.isascii():
+        decomposed = unicodedata.normalize('NFKD', text)
+        text = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(text.casefold().split())
+
+
+def _trigrams(folded: str) -> set[str]:
+    padded = f"  {folded} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _TrieNode:
+    __slots__ = ('children', 'riders')
+
+    def __init__(self):
+        self.children = {}
+        self.riders = set()  # Riders having a word starting with the prefix leading to this node
+
+
+class NameIndex:
+    """Search index over the riders' names, updated incrementally as riders are added.
+
+    Matching is case- and accent-insensitive (see `fold`). A query matches:
+    - by prefix, through a trie holding every name from the start of each of its words,
+      so that "mul" finds "Zoë Müller", in O(len(query)).
+    - fuzzily, through an index from trigram to riders, ranking names by the share of trigrams they have in common with the query.
+    """
+
+    def __init__(self):
+        self._root = _TrieNode()
+        self._folded = {}  # Rider -> folded name
+        self._trigrams = {}  # Trigram -> riders
+        self._n_trigrams = {}  # Rider -> number of trigrams in the folded name
+
+    def add(self, rider: str) -> None:
+        """Index a rider, if not already indexed.
+
+        Args:
+            rider (str): The rider's (normalized) name.
+        """
+        if rider in self._folded:
+            return
+        folded = fold(rider)
+        self._folded[rider] = folded
+
+        word_starts = [i for i, c in enumerate(folded) if c != ' ' and (i == 0 or folded[i - 1] == ' ')]
+        for start in word_starts:
+            node = self._root
+            for c in folded[start:]:
+                node = node.children.setdefault(c, _TrieNode())
+                node.riders.add(rider)
+
+        trigrams = _trigrams(folded)
+        for trigram in trigrams:
+            self._trigrams.setdefault(trigram, set()).add(rider)
+        self._n_trigrams[rider] = len(trigrams)
+
+    def search(self, query: str) -> dict[str, tuple[int, float]]:
+        """Find the riders matching the query.
+
+        Fuzzy matches are only looked for if no rider matches by prefix.
+
+        Args:
+            query (str): The (partial) name to search for.
+
+        Returns:
+            dict[str, tuple[int, float]]: The matching riders, with their match quality (EXACT, PREFIX, WORD_PREFIX or FUZZY)
+                and their similarity to the query (1 for non-fuzzy matches).
+        """
+        folded_query = fold(query)
+        if not folded_query:
+            return {}
+
+        node = self._root
+        for c in folded_query:
+            node = node.children.get(c)
+            if node is None:
+                break
+        else:
+            matches = {}
+            for rider in node.riders:
+                folded = self._folded[rider]
+                quality = EXACT if folded == folded_query else PREFIX if folded.startswith(folded_query) else WORD_PREFIX
+                matches[rider] = (quality, 1.0)
+            return matches
+
+        # A rider sharing n trigrams with the query has a similarity of at most n / len(query_trigrams),
+        # so reaching MIN_SIMILARITY requires sharing at least min_common of them, hence
+        # being in one of the (len(query_trigrams) - min_common + 1) rarest trigrams' riders (prefix filtering)
+        postings = sorted((self._trigrams.get(trigram, set()) for trigram in _trigrams(folded_query)), key=len)
+        min_common = math.ceil(MIN_SIMILARITY * len(postings))
+        n_candidate_postings = len(postings) - min_common + 1
+        candidates = set().union(*postings[:n_candidate_postings])
+
+        matches = {}
+        for rider in candidates:
+            n = sum(rider in riders for riders in postings)
+            similarity = n / (len(postings) + self._n_trigrams[rider] - n)
+            if similarity >= MIN_SIMILARITY:
+                matches[rider] = (FUZZY, similarity)
+        return matches
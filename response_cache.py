@@ -0,0 +1,162 @@
+import gzip
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Callable
+
+from fastapi import Request, Response
+
+from leaderboard import Leaderboard
+from serialization import dump_json
+
+try:
+    import brotli
+except ImportError:  # Optional, responses are then only gzipped
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # Higher qualities are much slower on large views, for a few % smaller bodies
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Encode the body with the content coding, one of `encodings()`."""
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    return body
+
+
+def encodings() -> list[str]:
+    """Content codings the responses can be encoded with, preferred first."""
+    return (["br"] if brotli is not None else []) + ["gzip", "identity"]
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str:
+    """Pick the content coding of the response from the request's Accept-Encoding header (RFC 9110, 12.5.3).
+
+    Args:
+        accept_encoding (str | None): The Accept-Encoding header, if any.
+
+    Returns:
+        str: The acceptable coding with the highest weight, ties going to the best compression, or 'identity'.
+    """
+    if not accept_encoding:
+        return "identity"
+
+    weights = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        weight = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if coding:
+            weights[coding] = weight
+
+    def weight(coding: str) -> float:
+        if coding in weights:
+            return weights[coding]
+        if coding == "identity":  # Acceptable unless excluded, explicitly or through *, yet the least preferred
+            return 0.001 if weights.get("*", 1.0) > 0 else 0.0
+        return weights.get("*", 0.0)
+
+    best = max(encodings(), key=weight)  # Ties keep the first, i.e. preferred, coding
+    return best if weight(best) > 0 else "identity"
+
+
+def _is_not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    # If-None-Match takes precedence over If-Modified-Since (RFC 9110, 13.2.2)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return since.tzinfo is not None and last_modified.replace(microsecond=0) <= since
+
+    return False
+
+
+class ResponseCache:
+    """Ready-made JSON responses of the leaderboard's views.
+
+    A view is only serialized again once the leaderboard's version changed, i.e. once after each write.
+    In between, serving it costs no serialization at all.
+    The version is exposed as a strong ETag, and the time of the last write as Last-Modified,
+    so that a client polling an unchanged view gets a bodyless 304 Not Modified.
+    Bodies are content-negotiated: their gzip (and, if the `brotli` package is installed, brotli) encodings
+    are also kept, each compressed once per version, the first time a client accepting it asks for the view.
+    Only the `max_entries` most recently used views are kept.
+    """
+
+    def __init__(self, leaderboard: Leaderboard, max_entries: int = 256):
+        self.leaderboard = leaderboard
+        self.max_entries = max_entries
+        self._epoch = uuid.uuid4().hex[:8]  # Versions restart from scratch in every process
+        self._entries = OrderedDict()  # view -> (version, {encoding: body}), least recently used first
+        self._lock = threading.Lock()  # Views are served from several threads
+
+    def _body(self, view: str, version: int, build: Callable[[], dict], encoding: str) -> bytes:
+        with self._lock:
+            entry = self._entries.get(view)
+            if entry is not None:
+                self._entries.move_to_end(view)
+        if entry is None or entry[0] != version:
+            # The version is read before building, so a concurrent write can only make the body newer than its version
+            entry = (version, {"identity": dump_json(build())})
+            with self._lock:
+                self._entries[view] = entry
+                self._entries.move_to_end(view)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        bodies = entry[1]
+        body = bodies.get(encoding)
+        if body is None:
+            # Two concurrent requests may both compress it, the last one wins with an identical body
+            body = bodies[encoding] = compress(bodies["identity"], encoding)
+        return body
+
+    def response(self, request: Request, view: str, build: Callable[[], dict]) -> Response:
+        """Get the JSON response of the view, building its body if the leaderboard changed since it was last built.
+
+        Args:
+            request (Request): The request, whose conditional headers are honored.
+            view (str): Name of the view, e.g. 'records'.
+            build (Callable[[], dict]): Builds the content of the view from the leaderboard.
+
+        Returns:
+            Response: The JSON response, in the best encoding the client accepts,
+                or a 304 Not Modified if the client's copy is up to date.
+        """
+        version, last_modified = self.leaderboard.state()
+        encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+        # Each encoding is a distinct representation, hence has its own strong ETag
+        etag = f'"{self._epoch}-{version}"' if encoding == "identity" else f'"{self._epoch}-{version}-{encoding}"'
+        headers = {
+            "ETag": etag,
+            "Last-Modified": format_datetime(last_modified, usegmt=True),
+            "Cache-Control": "no-cache",  # Clients may cache, but must revalidate
+            "Vary": "Accept-Encoding",
+        }
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+
+        if _is_not_modified(request, etag, last_modified):
+            return Response(status_code=304, headers=headers)
+
+        body = self._body(view, version, build, encoding)
+        return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,57 @@
+from typing import Annotated
+
+import msgspec
+from fastapi.responses import JSONResponse
+
+from ingest import MAX_DURATION_S
+
+_encoder = msgspec.json.Encoder()
+
+
+class Record(msgspec.Struct):
+    """A record submitted to POST /add-record."""
+
+    name: str
+    datetime: str  # Use a string for simplicity; can be parsed to datetime later
+    duration_s: Annotated[int, msgspec.Meta(ge=1, le=MAX_DURATION_S)]  # Same bounds as bulk uploads
+
+
+_record_decoder = msgspec.json.Decoder(Record, strict=False)  # Lax like pydantic, e.g. "60000" is a valid duration_s
+
+
+def dump_json(content) -> bytes:
+    """Serialize to JSON, with the same output as FastAPI's JSONResponse, but natively encoding datetimes (as ISO 8601)
+    and without going through `jsonable_encoder`, which is an order of magnitude faster on large views.
+    """
+    return _encoder.encode(content)
+
+
+def decode_record(body: bytes) -> Record:
+    """Decode and validate the JSON body of POST /add-record in a single pass.
+
+    Args:
+        body (bytes): The request's body.
+
+    Raises:
+        msgspec.DecodeError: If the body is not valid JSON, or not a valid record (msgspec.ValidationError).
+
+    Returns:
+        Record: The record.
+    """
+    return _record_decoder.decode(body)
+
+
+def json_schema(struct_type: type) -> dict:
+    """Get the JSON schema of a struct, for the OpenAPI docs of an endpoint decoding it itself."""
+    (_, ), components = msgspec.json.schema_components([struct_type])
+    return components[struct_type.__name__]
+
+
+class MsgspecJSONResponse(JSONResponse):
+    """JSON response rendered with `dump_json`.
+
+    Returned as is by an endpoint, it skips FastAPI's `jsonable_encoder` pass over the content.
+    """
+
+    def render(self, content) -> bytes:
+        return dump_json(content)
@@ -0,0 +1,408 @@
+import json
+import logging
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from binary_snapshot import BinarySnapshot, write_binary_snapshot
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ['rank', 'id', 'name', 'datetime', 'duration_s', 'avatar_url']
+
+
+def to_datetime(value) -> datetime:
+    """Parse a datetime, converting timezone-aware values to naive UTC so that all records compare.
+
+    Args:
+        value: Anything `pd.to_datetime` understands.
+
+    Returns:
+        datetime: The naive (UTC) datetime.
+    """
+    if type(value) is datetime and value.tzinfo is None:  # Already parsed, e.g. by a vectorized parse
+        return value
+    return pd.to_datetime(value, utc=True).tz_localize(None).to_pydatetime()
+
+
+def _file_signature(filepath: Path) -> tuple[int, int] | None:
+    try:
+        stat = filepath.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _fsync(filepath: Path) -> None:
+    fd = os.open(filepath, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("The arrow and parquet snapshot formats require pyarrow: `pip install pyarrow`") from e
+    return pyarrow
+
+
+def _arrow_schema(pa):
+    return pa.schema([
+        ('rank', pa.int64()),
+        ('id', pa.int64()),
+        ('name', pa.string()),
+        ('datetime', pa.timestamp('us')),
+        ('duration_s', pa.int64()),
+        ('avatar_url', pa.string()),
+    ])
+
+
+def _read_csv_snapshot(filepath: Path) -> list[dict]:
+    # Names are kept as written (e.g. 'NaN', 'None' or '1234'), only a missing avatar URL is None
+    df = pd.read_csv(filepath, dtype={'name': str, 'avatar_url': str}, keep_default_na=False, na_values={'avatar_url': ['']})
+    if 'id' not in df.columns:  # Snapshot written before records had an id
+        df = df.sort_values(by='rank')
+        df['id'] = range(1, len(df) + 1)
+    df['datetime'] = pd.to_datetime(df['datetime'], format='mixed', utc=True).dt.tz_localize(None)
+    df = df.astype(object).where(df.notna(), None)  # NaN -> None
+
+    return [
+        {
+            'id': int(r['id']),
+            'name': r['name'],
+            'datetime': r['datetime'].to_pydatetime(),
+            'duration_s': int(r['duration_s']),
+            'avatar_url': r['avatar_url'],
+        }
+        for r in df.to_dict(orient='records')
+    ]
+
+
+def read_snapshot(filepath: Path) -> list[dict]:
+    """Read a snapshot of the records, whose format is given by its extension.
+
+    '.csv' snapshots are parsed as text, while '.arrow' (Arrow IPC) and '.parquet' snapshots keep their typed schema.
+    '.arrow' and '.bin' (see `BinarySnapshot`) snapshots are memory-mapped and decoded a column at a time,
+    but all the records are still decoded into dicts: none are served from the mapped file.
+
+    Args:
+        filepath (Path): Path to the snapshot.
+
+    Returns:
+        list[dict]: The records, in no particular order.
+    """
+    if filepath.suffix == '.csv':
+        return _read_csv_snapshot(filepath)
+    if filepath.suffix == '.bin':
+        rows = BinarySnapshot(filepath).records()
+        for row in rows:
+            del row['rank']
+        return rows
+
+    pa = _import_pyarrow()
+    if filepath.suffix == '.arrow':
+        with pa.memory_map(str(filepath)) as source:
+            return pa.ipc.open_file(source).read_all().drop_columns(['rank']).to_pylist()
+    if filepath.suffix == '.parquet':
+        return pa.parquet.read_table(filepath, memory_map=True).drop_columns(['rank']).to_pylist()
+    raise ValueError(f"Unknown snapshot format: {filepath.suffix}")
+
+
+def _tmp_filepath(filepath: Path) -> Path:
+    return filepath.with_name(filepath.name + '.tmp')
+
+
+def _write_tmp_snapshot(rows: list[dict], filepath: Path) -> None:
+    tmp_filepath = _tmp_filepath(filepath)
+    if filepath.suffix == '.csv':
+        df = pd.DataFrame(rows, columns=COLUMNS[1:])
+        df.insert(0, 'rank', range(1, len(df) + 1))
+        df.to_csv(tmp_filepath, index=False)
+    elif filepath.suffix == '.bin':
+        write_binary_snapshot(rows, tmp_filepath)
+    else:
+        pa = _import_pyarrow()
+        schema = _arrow_schema(pa)
+        columns = {'rank': range(1, len(rows) + 1)} | {column: [row[column] for row in rows] for column in COLUMNS[1:]}
+        table = pa.table({column: pa.array(values, schema.field(column).type) for column, values in columns.items()})
+        if filepath.suffix == '.arrow':
+            with pa.OSFile(str(tmp_filepath), 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+                writer.write_table(table)
+        elif filepath.suffix == '.parquet':
+            pa.parquet.write_table(table, tmp_filepath)
+        else:
+            raise ValueError(f"Unknown snapshot format: {filepath.suffix}")
+    _fsync(tmp_filepath)
+
+
+def write_snapshot(rows: list[dict], filepath: Path) -> None:
+    """Atomically write a snapshot of the records, whose format is given by its extension.
+
+    Args:
+        rows (list[dict]): All the records, in rank order.
+        filepath (Path): Path to the snapshot, either '.csv', '.arrow', '.parquet' or '.bin'.
+    """
+    _write_tmp_snapshot(rows, filepath)
+    os.replace(_tmp_filepath(filepath), filepath)
+
+
+def convert_snapshot(src_filepath: Path, dst_filepath: Path) -> None:
+    """Convert a snapshot to another format, e.g. data/records.csv to data/records.arrow.
+
+    Args:
+        src_filepath (Path): Path to the existing snapshot.
+        dst_filepath (Path): Path to the converted snapshot, whose extension gives the format.
+    """
+    rows = read_snapshot(src_filepath)
+    rows.sort(key=lambda row: (row['duration_s'], row['datetime'], row['id']))
+    logger.info(f"Converting {len(rows)} records from {src_filepath} to {dst_filepath}")
+    write_snapshot(rows, dst_filepath)
+
+
+class Storage(ABC):
+    """Where the records are persisted. The leaderboard keeps them in memory, and only loads/appends through this."""
+
+    n_logged = 0  # Number of records appended since the last compaction
+
+    @abstractmethod
+    def signature(self):
+        """Identify the state of the storage, to detect writes from other processes."""
+
+    @abstractmethod
+    def load(self) -> list[dict]:
+        """Load all the records.
+
+        Returns:
+            list[dict]: The records, in no particular order.
+        """
+
+    @abstractmethod
+    def append(self, rows: list[dict]) -> None:
+        """Durably add the records.
+
+        Args:
+            rows (list[dict]): The records to add.
+        """
+
+    # Compaction, for storages needing to fold the appended records into their main storage, runs in three steps
+    # so that the leaderboard is only locked while sealing and swapping, not while writing all the records
+
+    def seal(self) -> bool:
+        """Set the records appended so far aside for the compaction, later appends going to a fresh log.
+
+        Returns:
+            bool: Whether there is anything to compact.
+        """
+        return False
+
+    def write_compacted(self, rows: list[dict]) -> None:
+        """Write the compacted storage aside, without swapping it in yet.
+
+        Args:
+            rows (list[dict]): All the records up to the seal (at least), in rank order.
+        """
+
+    def swap_compacted(self) -> None:
+        """Swap the compacted storage in, and drop the records set aside by `seal`."""
+
+
+class LogStorage(Storage):
+    """Append-only storage of the records: a snapshot plus a log of the records added since.
+
+    Adding records appends one JSON line per record to the log and fsyncs once per call,
+    so the cost of a write does not depend on the size of the leaderboard.
+    Compacting folds the log into a new snapshot: the log is first renamed to a sealed log (new appends starting
+    a fresh log), the snapshot is written aside, swapped in atomically, and only then is the sealed log deleted.
+    Both logs are read when loading, and every record carries a unique increasing id, so log lines already folded
+    into the snapshot (e.g. after a crash between the swap and the deletion) are skipped.
+    The snapshot's format (CSV, Arrow IPC, Parquet or fixed-width binary) is given by its extension, see `read_snapshot`.
+    """
+
+    def __init__(self, snapshot_filepath: Path, log_filepath: Path):
+        self.snapshot_filepath = snapshot_filepath
+        self.log_filepath = log_filepath
+        self.sealed_log_filepath = log_filepath.with_name(log_filepath.name + '.sealed')
+        self.n_logged = 0  # Number of records in the logs, i.e. not yet in the snapshot
+        self._n_sealed = 0  # Number of records in the sealed log
+
+        self.snapshot_filepath.parent.mkdir(parents=True, exist_ok=True)
+
+    def signature(self) -> tuple:
+        return (
+            _file_signature(self.snapshot_filepath),
+            _file_signature(self.sealed_log_filepath),
+            _file_signature(self.log_filepath),
+        )
+
+    def _load_log(self) -> list[dict]:
+        rows = []
+        for filepath in (self.sealed_log_filepath, self.log_filepath):  # The sealed log holds the older records
+            if not filepath.is_file():
+                continue
+            with open(filepath, encoding='utf-8') as f:
+                for line in f:
+                    if not line.endswith('\n'):  # Torn write, the record was never acknowledged
+                        logger.warning(f"Ignoring incomplete last line of {filepath}")
+                        break
+                    row = json.loads(line)
+                    row['datetime'] = datetime.fromisoformat(row['datetime'])
+                    rows.append(row)
+        return rows
+
+    def load(self) -> list[dict]:
+        """Rebuild the records from the snapshot and the log tail."""
+        rows = read_snapshot(self.snapshot_filepath) if self.snapshot_filepath.is_file() else []
+        last_snapshot_id = max((row['id'] for row in rows), default=0)
+        log_rows = [row for row in self._load_log() if row['id'] > last_snapshot_id]
+        self.n_logged = len(log_rows)
+        self._n_sealed = 0
+        return rows + log_rows
+
+    def append(self, rows: list[dict]) -> None:
+        """Durably append the records to the log, with a single fsync."""
+        lines = ''.join(json.dumps({**row, 'datetime': row['datetime'].isoformat()}) + '\n' for row in rows)
+        with open(self.log_filepath, 'a', encoding='utf-8') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        self.n_logged += len(rows)
+
+    def seal(self) -> bool:
+        """Rename the log to the sealed log, or append it to the sealed log left by an unfinished compaction."""
+        if self.n_logged == 0:
+            return False
+        if self.log_filepath.is_file():
+            if self.sealed_log_filepath.is_file():
+                with open(self.log_filepath, 'rb') as src, open(self.sealed_log_filepath, 'ab') as dst:
+                    dst.write(src.read())
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                self.log_filepath.unlink()
+            else:
+                os.replace(self.log_filepath, self.sealed_log_filepath)
+        self._n_sealed = self.n_logged
+        return True
+
+    def write_compacted(self, rows: list[dict]) -> None:
+        """Write the new snapshot next to the current one."""
+        _write_tmp_snapshot(rows, self.snapshot_filepath)
+
+    def swap_compacted(self) -> None:
+        """Atomically replace the snapshot by the new one, then delete the sealed log."""
+        os.replace(_tmp_filepath(self.snapshot_filepath), self.snapshot_filepath)
+        self.sealed_log_filepath.unlink(missing_ok=True)
+        self.n_logged -= self._n_sealed
+        self._n_sealed = 0
+
+
+class SqliteStorage(Storage):
+    """Storage of the records in an embedded SQLite database.
+
+    The database runs in WAL mode, so readers from other processes are not blocked by a writer,
+    and is indexed on the ranking order (duration_s, datetime, id), so the records load already ranked.
+    """
+
+    def __init__(self, filepath: Path, import_from: Storage | None = None):
+        """
+        Args:
+            filepath (Path): Path to the database file, created if needed.
+            import_from (Storage | None, optional): Storage whose records are imported if the database is empty,
+                e.g. to migrate from the CSV storage. Defaults to None.
+        """
+        self.filepath = filepath
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+
+        # Only ever used while holding the leaderboard's lock
+        self._connection = sqlite3.connect(filepath, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._connection:
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS records (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    datetime TEXT NOT NULL,
+                    duration_s INTEGER NOT NULL,
+                    avatar_url TEXT
+                )
+            """)
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS records_rank ON records (duration_s, datetime, id)"
+            )
+
+        if import_from is not None and self._count() == 0:
+            rows = import_from.load()
+            if rows:
+                logger.info(f"Importing {len(rows)} records into {self.filepath}")
+                self.append(rows)
+
+    def _count(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def signature(self) -> int:
+        # Changes whenever another connection commits
+        return self._connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def load(self) -> list[dict]:
+        """Load all the records, in rank order."""
+        cursor = self._connection.execute(
+            "SELECT id, name, datetime, duration_s, avatar_url FROM records ORDER BY duration_s, datetime, id"
+        )
+        return [
+            {
+                'id': id,
+                'name': name,
+                'datetime': datetime.fromisoformat(dt),
+                'duration_s': duration_s,
+                'avatar_url': avatar_url,
+            }
+            for id, name, dt, duration_s, avatar_url in cursor
+        ]
+
+    def append(self, rows: list[dict]) -> None:
+        """Insert the records in a single transaction."""
+        with self._connection:
+            self._connection.executemany(
+                "INSERT INTO records (id, name, datetime, duration_s, avatar_url) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (row['id'], row['name'], row['datetime'].isoformat(), row['duration_s'], row['avatar_url'])
+                    for row in rows
+                ],
+            )
+
+
+def make_storage(backend: str, data_dirpath: Path) -> Storage:
+    """Create the storage selected in the configuration.
+
+    Args:
+        backend (str): Either 'csv', 'arrow', 'parquet', 'bin' (snapshot in that format + append-only log) or 'sqlite'.
+        data_dirpath (Path): Folder holding the data files.
+
+    Raises:
+        ValueError: If the backend is unknown.
+
+    Returns:
+        Storage: The storage. Storages other than 'csv' import the CSV records on first use.
+    """
+    csv_filepath = data_dirpath / 'records.csv'
+    log_filepath = data_dirpath / 'records.log'
+    csv_storage = LogStorage(csv_filepath, log_filepath)
+    if backend == 'csv':
+        return csv_storage
+    if backend in ('arrow', 'parquet', 'bin'):
+        snapshot_filepath = data_dirpath / f'records.{backend}'
+        if not snapshot_filepath.is_file() and csv_filepath.is_file():
+            convert_snapshot(csv_filepath, snapshot_filepath)
+        return LogStorage(snapshot_filepath, log_filepath)
+    if backend == 'sqlite':
+        return SqliteStorage(data_dirpath / 'records.db', import_from=csv_storage)
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -0,0 +1,168 @@
+import asyncio
+import bisect
+import logging
+from concurrent.futures import Executor
+
+from events import Broadcaster
+from leaderboard import Leaderboard, normalize_name
+from serialization import dump_json
+
+logger = logging.getLogger(__name__)
+
+MAX_DELTA_OPS = 100  # Beyond that many operations, a view's subscribers are sent a new snapshot instead
+
+# A delta is a list of operations {'rank': r, 'record': record or None}, to apply in order:
+# the ranks >= r are shifted by +1, and then the record (if any) is inserted at rank r.
+# Committed records are turned into operations in rank order, so each operation's rank is already final.
+
+
+def _state_position_to_rank(position: int, later_ranks: list[int]) -> int:
+    # While applying the operations, the records with the (sorted) `later_ranks` are not inserted yet:
+    # find the final rank of the record at `position` by skipping them
+    n_skipped = 0
+    while True:
+        n = bisect.bisect_right(later_ranks, position + n_skipped)
+        if n == n_skipped:
+            return position + n_skipped
+        n_skipped = n
+
+
+class RankWindow:
+    """View of the records ranked from `from_rank` to `to_rank` (inclusive), e.g. the podium (from rank 1)."""
+
+    def __init__(self, from_rank: int, to_rank: int):
+        self.from_rank = from_rank
+        self.to_rank = to_rank
+        self.key = ('window', from_rank, to_rank)
+
+    def snapshot(self, leaderboard: Leaderboard) -> dict:
+        return {'from_rank': self.from_rank, 'to_rank': self.to_rank, 'records': leaderboard.records(self.from_rank - 1, self.to_rank)}
+
+    def delta(self, leaderboard: Leaderboard, added: list[dict]) -> list[dict] | None:
+        """Turn committed records into operations on the window, None if there are too many of them.
+
+        A record inserted above the window shifts it by one: the record then entering the window at `from_rank` is sent.
+        """
+        ranks = sorted(record['rank'] for record in added)
+        records_by_rank = {record['rank']: record for record in added}
+        ops = []
+        for i, rank in enumerate(ranks):
+            if rank > self.to_rank or len(ops) > MAX_DELTA_OPS:
+                break
+            if rank >= self.from_rank:
+                ops.append({'rank': rank, 'record': records_by_rank[rank]})
+            else:
+                entering_rank = _state_position_to_rank(self.from_rank, ranks[i + 1:])
+                for entering in leaderboard.records(entering_rank - 1, entering_rank):  # No record enters if there is none at from_rank
+                    ops.append({'rank': self.from_rank, 'record': {**entering, 'rank': self.from_rank}})
+        return ops if len(ops) <= MAX_DELTA_OPS else None
+
+
+class RiderView:
+    """View of a rider's records, as GET /riders/{name} but without their best rank and percentile.
+
+    The percentile changes with every record added, even below the rider's attempts, which the deltas leave out,
+    while the best rank is the first attempt's.
+    """
+
+    def __init__(self, name: str):
+        self.name = normalize_name(name)
+        self.key = ('rider', self.name)
+
+    def snapshot(self, leaderboard: Leaderboard) -> dict:
+        rider = leaderboard.rider(self.name)
+        return {'rider': None if rider is None else {'name': rider['name'], 'attempts': rider['attempts']}}
+
+    def delta(self, leaderboard: Leaderboard, added: list[dict]) -> list[dict] | None:
+        """Turn committed records into operations on the rider's records, None if there are too many of them.
+
+        Records inserted below all of the rider's records are left out, as they shift none of them.
+        """
+        rider = leaderboard.rider(self.name)
+        if rider is None:
+            return []
+        worst_rank = rider['attempts'][-1]['rank']
+        ops = [
+            {'rank': record['rank'], 'record': record if normalize_name(record['name']) == self.name else None}
+            for record in sorted(added, key=lambda record: record['rank'])
+            if record['rank'] <= worst_rank
+        ]
+        return ops if len(ops) <= MAX_DELTA_OPS else None
+
+
+class SubscriptionHub:
+    """Live views of the leaderboard, kept up to date with deltas rather than whole lists.
+
+    Subscribers of the same view share it: after each commit, its delta is computed and serialized once,
+    and handed to all of them through a `Broadcaster`, which drops the subscribers lagging by `max_queue_size` messages.
+    Messages are (version, body) pairs, the body being JSON with a 'type' of:
+    - 'snapshot': the whole view, when subscribing or when a delta would be larger than it (MAX_DELTA_OPS).
+    - 'delta': the operations to apply to the view, see above.
+    The body is None if the records changed other than through a commit (e.g. reloaded from storage):
+    the view must then be read again.
+    """
+
+    def __init__(self, leaderboard: Leaderboard, executor: Executor, max_queue_size: int):
+        self.leaderboard = leaderboard
+        self.executor = executor
+        self.max_queue_size = max_queue_size
+        self._views = {}  # view key -> (view, broadcaster)
+
+    def subscribe(self, view: RankWindow | RiderView) -> asyncio.Queue:
+        """Subscribe to the view's messages, see `Broadcaster.subscribe`."""
+        if view.key not in self._views:
+            self._views[view.key] = (view, Broadcaster(max_queue_size=self.max_queue_size))
+        return self._views[view.key][1].subscribe()
+
+    def unsubscribe(self, view: RankWindow | RiderView, queue: asyncio.Queue) -> None:
+        """Stop receiving the view's messages, forgetting the view once it has no subscribers left."""
+        entry = self._views.get(view.key)
+        if entry is None:
+            return
+        broadcaster = entry[1]
+        broadcaster.unsubscribe(queue)
+        if not broadcaster:
+            del self._views[view.key]
+
+    def snapshot(self, view: RankWindow | RiderView) -> tuple[int, bytes]:
+        """Read the whole view, consistently with the version it is read at (blocking).
+
+        Returns:
+            tuple[int, bytes]: The version, and the 'snapshot' message.
+        """
+        while True:
+            version, _ = self.leaderboard.state()
+            content = view.snapshot(self.leaderboard)
+            # Only the commit queue adds records, one commit at a time: if the version did not change, none happened meanwhile
+            if self.leaderboard.state()[0] == version:
+                return version, dump_json({'type': 'snapshot', 'version': version, **content})
+
+    def _messages(self, version: int, added: list[dict], views: list) -> dict[tuple, bytes] | None:
+        messages = {}
+        for view in views:
+            ops = view.delta(self.leaderboard, added)
+            if ops is None:
+                messages[view.key] = dump_json({'type': 'snapshot', 'version': version, **view.snapshot(self.leaderboard)})
+            elif ops:
+                messages[view.key] = dump_json({'type': 'delta', 'version': version, 'ops': ops})
+        if self.leaderboard.state()[0] != version:  # Reloaded from storage meanwhile, the deltas may be wrong
+            return None
+        return messages
+
+    async def on_commit(self, version: int, added: list[dict]) -> None:
+        """Publish each live view's delta, as a commit listener (see `CommitQueue.add_listener`).
+
+        Awaited by the commit queue before its next commit, so the deltas are computed against the committed leaderboard.
+        """
+        if not self._views:
+            return
+        views = [view for view, _ in self._views.values()]
+        messages = await asyncio.get_running_loop().run_in_executor(self.executor, self._messages, version, added, views)
+        if messages is None:
+            logger.warning("Records changed outside of the commit, resyncing the live views")
+            for _, broadcaster in self._views.values():
+                broadcaster.publish((version, None))
+            return
+        for key, message in messages.items():
+            if key in self._views:  # Its last subscriber may have left meanwhile
+                self._views[key][1].publish((version, message))
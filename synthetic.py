@@ -0,0 +1,113 @@
+"""Generate synthetic records, e.g. to test the backend at realistic or stress scale.
+
+Usage (from the repository's root, writing to the storage selected by STORAGE_BACKEND in ./data):
+    python synthetic.py --n 1000000 --seed 42
+"""
+import argparse
+import logging
+import os
+import string
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+FIRST_NAMES = [
+    "Anaïs", "Andrea", "Anna", "Björn", "Célia", "Chiara", "Daniel", "David", "Élodie", "Fabian",
+    "Florian", "Gaëlle", "Jürg", "Laura", "Lea", "Léa", "Loïc", "Luca", "Lukas", "Manon",
+    "Marc", "Mathéo", "Mia", "Nadège", "Nicolas", "Noël", "Noémie", "Reto", "Sara", "Simon",
+    "Sophie", "Stéphane", "Thomas", "Urs", "Valentina", "Yannick", "Zoë", "Ömer", "Maëlle", "Ruedi",
+]
+LAST_NAMES = [
+    "Bernasconi", "Brunner", "Bühler", "Baumann", "Crettenand", "Egli", "Fässler", "Frésard", "Gächter", "Gerber",
+    "Graf", "Huber", "Keller", "Köhler", "Kälin", "Lüthi", "Meier", "Moser", "Müller", "Perrin",
+    "Rossi", "Rüegg", "Schläpfer", "Schmid", "Schneider", "Steiner", "Sutter", "Vonlanthen", "Weber", "Zürcher",
+    "Favre", "Bonvin", "Chappuis", "Rochat", "Ferrari", "Brägger", "Wyss", "Bättig", "Zbinden", "Märki",
+]
+AVATAR_URL_TEMPLATE = "https://avatars.githubusercontent.com/u/{}"
+FIRST_DATETIME = datetime(2015, 1, 1)
+
+
+def generate_records(n: int, seed: int | None = None, until: datetime | None = None) -> list[dict]:
+    """Generate records, in a vectorized way so that millions of records take seconds.
+
+    Durations follow a log-normal distribution around 14h (roughly 350 km at 25 km/h), clipped to [8h, 72h].
+    Datetimes are uniform from 2015 until `until`, names are drawn from common Swiss first and last names
+    (with middle initials, for about 40k distinct riders), and a third of the records have no avatar.
+
+    Args:
+        n (int): Number of records.
+        seed (int | None, optional): Seed of the random generator, for reproducible records. Defaults to None.
+        until (datetime | None, optional): Latest datetime. Defaults to None, i.e. now.
+
+    Returns:
+        list[dict]: The records, with keys 'name', 'datetime', 'duration_s' and 'avatar_url'.
+    """
+    rng = np.random.default_rng(seed)
+    until = until or datetime.now()
+
+    durations = np.clip(rng.lognormal(mean=np.log(14 * 3600), sigma=0.25, size=n), 8 * 3600, 72 * 3600).astype(np.int64)
+
+    span_s = int((until - FIRST_DATETIME).total_seconds())
+    datetimes = pd.Timestamp(FIRST_DATETIME) + pd.to_timedelta(rng.integers(0, span_s, size=n), unit='s')
+
+    first_names = np.array(FIRST_NAMES, dtype=object)[rng.integers(0, len(FIRST_NAMES), size=n)]
+    initials = np.array(list(string.ascii_uppercase), dtype=object)[rng.integers(0, 26, size=n)]
+    last_names = np.array(LAST_NAMES, dtype=object)[rng.integers(0, len(LAST_NAMES), size=n)]
+    names = first_names + " " + initials + ". " + last_names
+
+    avatar_ids = rng.integers(1, 10**8, size=n)
+    has_avatar = rng.random(size=n) >= 1 / 3
+
+    return [
+        {
+            'name': name,
+            'datetime': dt,
+            'duration_s': duration_s,
+            'avatar_url': AVATAR_URL_TEMPLATE.format(avatar_id) if avatar else None,
+        }
+        for name, dt, duration_s, avatar_id, avatar in zip(
+            names.tolist(),
+            datetimes.to_pydatetime(),
+            durations.tolist(),
+            avatar_ids.tolist(),
+            has_avatar.tolist(),
+        )
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, required=True, help="Number of records to generate.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed, for reproducible records.")
+    parser.add_argument("--data-dirpath", type=Path, default=Path('data'), help="Folder holding the data files.")
+    parser.add_argument("--storage-backend", default=os.environ.get('STORAGE_BACKEND', 'csv'))
+    args = parser.parse_args()
+
+    from storage import LogStorage, make_storage, write_snapshot
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    storage = make_storage(args.storage_backend, args.data_dirpath)
+    rows = storage.load()
+    next_id = max((row['id'] for row in rows), default=0) + 1
+
+    logger.info(f"Generating {args.n} records")
+    new_rows = [{'id': next_id + i, **record} for i, record in enumerate(generate_records(args.n, seed=args.seed))]
+
+    # Written straight to storage, in its format: the server reloads it when it notices the change
+    logger.info(f"Writing {args.n} records to the {args.storage_backend} storage")
+    if isinstance(storage, LogStorage):
+        # Straight into a new snapshot, rather than through the log
+        rows.extend(new_rows)
+        rows.sort(key=lambda row: (row['duration_s'], row['datetime'], row['id']))
+        write_snapshot(rows, storage.snapshot_filepath)  # Logged records are in it too, so they are skipped when loading
+    else:
+        storage.append(new_rows)
+
+
+if __name__ == "__main__":
+    main()